@@ -1,18 +1,88 @@
 import openai
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import win32com.client
+import sys
 from dateutil import parser
 import logging
 import json
+import time
+import hashlib
+import argparse
+import asyncio
+from response_cache import ResponseCache, make_cache_key
+import async_extraction
+import batch_backfill
+import prompt_packing
+import body_reduction
+import run_metrics
+import extraction_schema
+import ner_cascade
+import relevance_filter
+import resilience
+import near_duplicates
+import body_windowing
+import model_routing
+import mail_sources
+import incremental_sync
+import category_writeback
+import pipeline
+import attachment_text
+import html_text
+import watch_mode
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Load the OpenAI API key from a config file
-with open("api_key.txt", "r") as file:
-    openai.api_key = file.read().strip()
+# Command-line options (the defaults keep the original one-email-at-a-time behaviour)
+arg_parser = argparse.ArgumentParser(description="Extract bid information from Outlook emails into the bid calendar.")
+arg_parser.add_argument("--concurrency", type=int, default=1, help="Maximum number of extraction requests in flight (1 = sequential).")
+arg_parser.add_argument("--rpm", type=int, default=async_extraction.REQUESTS_PER_MINUTE, help="Requests-per-minute budget for concurrent extraction.")
+arg_parser.add_argument("--tpm", type=int, default=async_extraction.TOKENS_PER_MINUTE, help="Tokens-per-minute budget for concurrent extraction.")
+arg_parser.add_argument("--backfill", action="store_true", help="Send the selected emails through the Batch API instead of live requests (resumable).")
+arg_parser.add_argument("--batch-endpoint", choices=["openai", "local"], default="openai", help="Batch endpoint for --backfill; 'local' is a file-based stand-in for testing.")
+arg_parser.add_argument("--pack", action="store_true", help="Pack several short emails into each request (sequential extraction only).")
+arg_parser.add_argument("--full-body", action="store_true", help="Send message bodies verbatim instead of stripping quoted history, signatures and footers.")
+arg_parser.add_argument("--cascade", action="store_true", help="Try the local NER model first and only send low-confidence emails to the LLM.")
+arg_parser.add_argument("--ner-threshold", type=float, default=ner_cascade.CONFIDENCE_THRESHOLD, help="Minimum local confidence (0-1) to skip the LLM in --cascade mode.")
+arg_parser.add_argument("--relevance-filter", action="store_true", help="Skip emails the relevance classifier scores as non-bids (see relevance_report.csv).")
+arg_parser.add_argument("--relevance-threshold", type=float, default=relevance_filter.RELEVANCE_THRESHOLD, help="Minimum bid probability (0-1) for an email to be extracted.")
+arg_parser.add_argument("--dedup", action="store_true", help="Extract near-duplicate copies of the same invite once and share the result.")
+arg_parser.add_argument("--api-base", help="Send API requests to another OpenAI-compatible server, e.g. http://127.0.0.1:8089/v1 for stub_server.py.")
+arg_parser.add_argument("--window-tokens", type=int, default=0, help="Cap long bodies to about this many tokens around bid keywords (0 = off); falls back to the full body if fields come back empty.")
+arg_parser.add_argument("--route", action="store_true", help="Send short, template-like emails to gpt-4o-mini and escalate to gpt-4o only when needed.")
+arg_parser.add_argument("--source", choices=["outlook", "eml", "mbox", "maildir", "imap"], default="outlook", help="Where to read emails from; the file formats and IMAP allow headless runs without Outlook.")
+arg_parser.add_argument("--source-path", help="Directory of .eml files, mbox file or directory, Maildir, or imaps://user@host URL (password in IMAP_PASSWORD or imap_password.txt).")
+arg_parser.add_argument("--incremental", action="store_true", help="Only fetch mail newer than the folder's saved checkpoint (sync_checkpoints.json) instead of asking how many emails to process; the run's projects are merged into the calendar as with --upsert.")
+arg_parser.add_argument("--folder", help="Bid folder to use, as listed by the folder prompt (e.g. 'Inbox\\Bid Invites'); skips folder discovery.")
+arg_parser.add_argument("--emails", help="Emails to process without prompting: '15', '15,200' or '7d' for the last 7 days.")
+arg_parser.add_argument("--refresh-folders", action="store_true", help="Rebuild the Outlook folder index (folder_index.json) now, e.g. after adding a Bid folder; it is otherwise rebuilt once a day.")
+arg_parser.add_argument("--html-body", action="store_true", help="Read HTMLBody and convert it to text (keeps table rows together) instead of using Outlook's plain-text Body.")
+arg_parser.add_argument("--attachments", action="store_true", help="Add the text of PDF, DOCX and XLSX attachments (e.g. Invitation to Bid documents) to the body sent for extraction.")
+arg_parser.add_argument("--pipeline", action="store_true", help="Overlap reading, body reduction, extraction (--concurrency threads) and result storage as pipelined stages; not combined with --backfill, --pack, --dedup or --cascade.")
+arg_parser.add_argument("--upsert", action="store_true", help="Merge this run's projects into the existing calendar instead of replacing it (always on with --incremental).")
+arg_parser.add_argument("--watch", action="store_true", help="Keep running and process new mail in the Bid folders (or --folder) as it arrives; each burst is an incremental --upsert run with the other options given.")
+arg_parser.add_argument("--poll-seconds", type=int, default=watch_mode.POLL_SECONDS, help="How often --watch checks the folders for mail past their checkpoint.")
+arg_parser.add_argument("--debounce-seconds", type=int, default=watch_mode.DEBOUNCE_SECONDS, help="How long a folder must be quiet before --watch runs it, so a burst of emails is one run.")
+arg_parser.add_argument("--benchmark", metavar="CSV", help="Compare latency, cost and field agreement of each route on a labelled sample, then exit.")
+args = arg_parser.parse_args()
+if args.pipeline and (args.backfill or args.pack or args.dedup or args.cascade):
+    arg_parser.error("--pipeline streams emails one at a time and can't be combined with --backfill, --pack, --dedup or --cascade")
+if args.watch and (args.backfill or args.benchmark):
+    arg_parser.error("--watch runs live extraction and can't be combined with --backfill or --benchmark")
+if args.source != "outlook" and not args.source_path:
+    arg_parser.error(f"--source {args.source} needs --source-path")
+
+# Load the OpenAI API key from a config file (a local stub server doesn't need a real one)
+try:
+    with open("api_key.txt", "r") as file:
+        openai.api_key = file.read().strip()
+except FileNotFoundError:
+    if not args.api_base:
+        raise
+    openai.api_key = "stub"
+if args.api_base:
+    openai.api_base = args.api_base
 
 # Load corrections from a JSON file
 def load_corrections():
@@ -30,43 +100,240 @@ def save_corrections(corrections):
 # Load existing corrections
 corrections = load_corrections()
 
-# Function to connect to the OpenAI API and extract relevant information from email content
-def extract_email_info(subject, body):
+# Model settings for extraction (all of these are part of the response cache key)
+MODEL = model_routing.LARGE_MODEL
+MAX_TOKENS = 500
+SYSTEM_PROMPT = "You are an assistant extracting project information from emails. Always reply with a single JSON object and nothing else."
+USER_PROMPT = "Extract the project name, contractor, bid due date, job walk information (if available), and a brief project description (highlight union or prevailing wage if mentioned) from the following email:\n\nEmail Example:\nSubject: {subject}\nBody: {body}\n\nRespond with a JSON object matching this schema, using null for anything the email doesn't mention:\n" + extraction_schema.schema_text()
+REPAIR_PROMPT = "Your reply was not valid for the schema ({error}). Reply again with only the corrected JSON object matching the schema."
+
+# Cache of previous responses so re-processed emails don't hit the API again
+response_cache = ResponseCache()
+
+# Counts of which model each email started on when --route is used
+routing_stats = model_routing.RoutingStats()
+
+# Errors worth retrying; rate limits are left to the async engine in concurrent runs
+TRANSIENT_ERRORS = (openai.error.Timeout, openai.error.APIError, openai.error.APIConnectionError, openai.error.ServiceUnavailableError, openai.error.TryAgain)
+
+# Shared circuit breaker that pauses the run while the API keeps failing
+breaker = resilience.CircuitBreaker()
+
+# Token, latency and cost records for every extraction call in this run
+metrics = run_metrics.RunMetrics(prompt_version=hashlib.sha256((SYSTEM_PROMPT + USER_PROMPT).encode("utf-8")).hexdigest()[:12])
+
+# Function to build the chat messages sent for one email
+def build_messages(subject, body):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT.format(subject=subject, body=body)}
+    ]
+
+# Function to build the request body used for live and batch requests
+def build_request_body(subject, body, messages=None, max_tokens=MAX_TOKENS, model=MODEL):
+    return {
+        "model": model,
+        "messages": messages or build_messages(subject, body),
+        "max_tokens": max_tokens,
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"}
+    }
+
+# Function to build a follow-up request asking the model to fix an invalid payload
+def build_repair_body(request_body, content, error):
+    repaired = dict(request_body)
+    repaired["messages"] = request_body["messages"] + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": REPAIR_PROMPT.format(error=error)}
+    ]
+    return repaired
+
+# Function to estimate the tokens one request will use (prompt plus the completion budget)
+def estimate_tokens(subject, body):
+    return (len(SYSTEM_PROMPT) + len(USER_PROMPT) + len(subject or "") + len(body or "")) // 4 + MAX_TOKENS
+
+# Function to validate the model's JSON reply and return the extracted fields
+def parse_extraction(content):
+    project_name, contractor, bid_due_date, job_walk, description = extraction_schema.parse_record(content)
+    logging.info("Extracted - Project Name: %s, Contractor: %s, Bid Due Date: %s, Job Walk: %s, Description: %s", project_name, contractor, bid_due_date, job_walk, description)
+    return project_name, contractor, bid_due_date, job_walk, description
+
+# Function to send one chat completion and record its usage
+def create_completion(subject, request_body, emails=1):
+    started = time.monotonic()
+    response = resilience.retry_call(openai.ChatCompletion.create, retry_on=TRANSIENT_ERRORS + (openai.error.RateLimitError,),
+                                     breaker=breaker, on_retry=lambda: metrics.count_retry(subject), **request_body)
+    metrics.record(subject, request_body["model"], time.monotonic() - started, *run_metrics.response_usage(response), emails=emails)
+    return response.choices[0].message['content']
+
+# Async version of create_completion
+async def create_completion_async(subject, request_body, emails=1):
+    started = time.monotonic()
+    response = await resilience.retry_call_async(openai.ChatCompletion.acreate, retry_on=TRANSIENT_ERRORS,
+                                                 breaker=breaker, on_retry=lambda: metrics.count_retry(subject), **request_body)
+    metrics.record(subject, request_body["model"], time.monotonic() - started, *run_metrics.response_usage(response), emails=emails)
+    return response.choices[0].message['content']
+
+# Function to look up a cached response for an email
+def cached_extraction(subject, body, model=MODEL):
+    cache_key = make_cache_key(subject, body, model, SYSTEM_PROMPT + USER_PROMPT, MAX_TOKENS)
+    content = response_cache.get(cache_key)
+    if content is not None:
+        logging.info("Using cached response for email with subject: %s", subject)
+        metrics.record(subject, model, 0.0, cached=True)
+    return cache_key, content
+
+# Function to connect to the OpenAI API and extract relevant information from email content.
+# Returns None if the extraction failed, so the email can be retried on the next run.
+def extract_email_info(subject, body, model=MODEL):
+    try:
+        logging.info("Extracting information from email with subject: %s", subject)
+        cache_key, content = cached_extraction(subject, body, model)
+        if content is not None:
+            return parse_extraction(content)
+
+        request_body = build_request_body(subject, body, model=model)
+        content = create_completion(subject, request_body)
+        try:
+            result = parse_extraction(content)
+        except extraction_schema.SchemaError as e:
+            # One targeted repair attempt before giving up on the email
+            logging.warning("Invalid extraction for '%s' (%s), requesting a repair", subject, e)
+            metrics.count_repair()
+            content = create_completion(subject, build_repair_body(request_body, content, e), emails=0)
+            result = parse_extraction(content)
+
+        # Only valid payloads are cached
+        response_cache.put(cache_key, content)
+        return result
+
+    except Exception as e:
+        logging.error(f"Failed to process email: {e}")
+        return None
+
+# Async version of extract_email_info for concurrent runs; rate-limit errors are
+# re-raised so the engine can back off and retry
+async def extract_email_info_async(subject, body, model=MODEL):
     try:
         logging.info("Extracting information from email with subject: %s", subject)
-        response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an assistant extracting project information from emails."},
-                {"role": "user", "content": f"Extract the project name, contractor, bid due date, job walk information (if available), and a brief project description (highlight union or prevailing wage if mentioned) from the following email:\n\nEmail Example:\nSubject: {subject}\nBody: {body}\n\nThe format of the response should be:\nProject Name: ...\nContractor: ...\nBid Due Date: ...\nJob Walk: ...\nDescription: ..."}
-            ],
-            max_tokens=500,
-            temperature=0.2
-        )
-
-        content = response.choices[0].message['content']
-        lines = content.split('\n')
-        project_name, contractor, bid_due_date, job_walk, description = None, None, None, None, None
-
-        # Extract the relevant fields from the response
-        for line in lines:
-            if line.startswith("Project Name:"):
-                project_name = line.replace("Project Name:", "").strip()
-            elif line.startswith("Contractor:"):
-                contractor = line.replace("Contractor:", "").strip()
-            elif line.startswith("Bid Due Date:"):
-                bid_due_date = line.replace("Bid Due Date:", "").strip()
-            elif line.startswith("Job Walk:"):
-                job_walk = line.replace("Job Walk:", "").strip()
-            elif line.startswith("Description:"):
-                description = line.replace("Description:", "").strip()
-
-        logging.info("Extracted - Project Name: %s, Contractor: %s, Bid Due Date: %s, Job Walk: %s, Description: %s", project_name, contractor, bid_due_date, job_walk, description)
-        return project_name, contractor, bid_due_date, job_walk, description
+        cache_key, content = cached_extraction(subject, body, model)
+        if content is not None:
+            return parse_extraction(content)
 
+        request_body = build_request_body(subject, body, model=model)
+        content = await create_completion_async(subject, request_body)
+        try:
+            result = parse_extraction(content)
+        except extraction_schema.SchemaError as e:
+            logging.warning("Invalid extraction for '%s' (%s), requesting a repair", subject, e)
+            metrics.count_repair()
+            content = await create_completion_async(subject, build_repair_body(request_body, content, e), emails=0)
+            result = parse_extraction(content)
+
+        response_cache.put(cache_key, content)
+        return result
+
+    except openai.error.RateLimitError:
+        raise
     except Exception as e:
         logging.error(f"Failed to process email: {e}")
-        return None, None, None, None, None
+        return None
+
+# Function to extract an email on the model chosen by the router, escalating
+# to the large model when the cheap model's output fails validation or misses fields
+def extract_routed(subject, body):
+    model = model_routing.choose_model(subject, body)
+    routing_stats.routes[model] += 1
+    result = extract_email_info(subject, body, model)
+    if model != MODEL and model_routing.needs_escalation(result):
+        logging.info("Escalating '%s' from %s to %s", subject, model, MODEL)
+        routing_stats.escalations += 1
+        result = extract_email_info(subject, body, MODEL)
+    return result
+
+# Async version of extract_routed
+async def extract_routed_async(subject, body):
+    model = model_routing.choose_model(subject, body)
+    routing_stats.routes[model] += 1
+    result = await extract_email_info_async(subject, body, model)
+    if model != MODEL and model_routing.needs_escalation(result):
+        logging.info("Escalating '%s' from %s to %s", subject, model, MODEL)
+        routing_stats.escalations += 1
+        result = await extract_email_info_async(subject, body, MODEL)
+    return result
+
+# Function used by --benchmark: one uncached call on the given model, returning (fields, latency, cost)
+def benchmark_extract(subject, body, model):
+    calls_before = len(metrics.calls)
+    started = time.monotonic()
+    try:
+        fields = parse_extraction(create_completion(subject, build_request_body(subject, body, model=model)))
+    except Exception as e:
+        logging.error("Benchmark extraction failed on %s for '%s': %s", model, subject, e)
+        fields = None
+    return fields, time.monotonic() - started, sum(call["cost"] for call in metrics.calls[calls_before:])
+
+# Function to extract jobs with short emails packed into shared requests, falling back
+# to single-email requests whenever a packed response can't be split cleanly
+def extract_packed(jobs, on_result=None):
+    extracted = {}
+    packing_stats = prompt_packing.PackingStats()
+    packed_prompt = SYSTEM_PROMPT + prompt_packing.PACKED_PROMPT
+
+    # Emails answered by an earlier packed request come straight from the cache
+    uncached = []
+    for entry_id, subject, body in jobs:
+        content = response_cache.get(make_cache_key(subject, body, MODEL, packed_prompt, MAX_TOKENS))
+        if content is None:
+            uncached.append((entry_id, subject, body))
+        else:
+            metrics.record(subject, MODEL, 0.0, cached=True)
+            extracted[entry_id] = parse_extraction(content)
+
+    groups = prompt_packing.pack_jobs(uncached, lambda subject, body: (len(subject or "") + len(body or "")) // 4)
+    for group in groups:
+        packing_stats.emails += len(group)
+        if len(group) == 1:
+            entry_id, subject, body = group[0]
+            packing_stats.requests += 1
+            extracted[entry_id] = extract_email_info(subject, body)
+            if on_result:
+                on_result(entry_id, extracted[entry_id])
+            continue
+
+        records = None
+        try:
+            logging.info("Extracting information from %d packed emails", len(group))
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt_packing.build_packed_prompt(group)}
+            ]
+            content = create_completion(" | ".join(subject for _, subject, _ in group),
+                                        build_request_body(None, None, messages, prompt_packing.MAX_TOKENS_PER_PACKED_EMAIL * len(group)),
+                                        emails=len(group))
+            packing_stats.requests += 1
+            records = prompt_packing.split_packed_response(content, group)
+        except Exception as e:
+            logging.error(f"Failed to process packed emails: {e}")
+
+        if records is None:
+            logging.warning("Falling back to single-email requests for %d emails", len(group))
+            packing_stats.fallbacks += 1
+            for entry_id, subject, body in group:
+                packing_stats.requests += 1
+                extracted[entry_id] = extract_email_info(subject, body)
+                if on_result:
+                    on_result(entry_id, extracted[entry_id])
+            continue
+
+        for entry_id, subject, body in group:
+            response_cache.put(make_cache_key(subject, body, MODEL, packed_prompt, MAX_TOKENS), records[entry_id])
+            extracted[entry_id] = parse_extraction(records[entry_id])
+            if on_result:
+                on_result(entry_id, extracted[entry_id])
+
+    logging.info("Packing: %s", packing_stats.summary())
+    return extracted
 
 # Function to normalize dates to mm/dd/yy format
 def normalize_date(date_str):
@@ -77,109 +344,441 @@ def normalize_date(date_str):
         logging.warning("Failed to parse date '%s': %s", date_str, e)
         return "01/01/11**"
 
-# Connect to Outlook and get the namespace
-logging.info("Connecting to Outlook...")
-outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
-
-# Function to recursively find folders containing the keyword "Bid"
-def find_bid_folders(folder, folder_path=""):
-    bid_folders = []
-    folder_path = f"{folder_path}\\{folder.Name}" if folder_path else folder.Name
-    
-    # Check if the current folder's name contains "Bid"
-    if "Bid" in folder.Name:
-        bid_folders.append((folder_path, folder))
-    
-    # Recursively search subfolders
-    for subfolder in folder.Folders:
-        bid_folders.extend(find_bid_folders(subfolder, folder_path))
-    
-    return bid_folders
-
-# Get emails from a selected folder
-bid_folders = []
-for folder in outlook.Folders:
-    bid_folders.extend(find_bid_folders(folder))
-
-if bid_folders:
-    print("Found the following folders with 'Bid' in the name:")
-    for i, (path, _) in enumerate(bid_folders):
-        print(f"{i+1}. {path}")
-    
-    selection = int(input("Please enter the number of the folder you want to use: ")) - 1
-    selected_folder = bid_folders[selection][1]
-
-    # Retrieve emails from the selected folder
-    messages = selected_folder.Items
-    logging.info("Total emails in the selected folder: %d", len(messages))
-
-    # Ask for the number of most recent emails to process
-    user_input = input("How many recent emails would you like to process? (e.g., '15' or '15,200'): ")
-    if "," in user_input:
-        num_emails, start_index = map(int, user_input.split(","))
+# Function to normalize an extraction, apply corrections and build the calendar row
+def finalize_record(project_name, contractor, bid_due_date, job_walk, description):
+    # Normalize bid due date
+    bid_due_date = normalize_date(bid_due_date) if bid_due_date else "01/01/11**"
+
+    # Apply corrections if available
+    if project_name in corrections:
+        corrected_info = corrections[project_name]
+        contractor = corrected_info.get("Contractor", contractor)
+        bid_due_date = corrected_info.get("Bid Due Date", bid_due_date)
+
+    return {
+        "Project Name": project_name,
+        "Contractor": contractor,
+        "Bid Due Date": bid_due_date if bid_due_date != "Not specified" else "",
+        "Job Walk": job_walk if job_walk else "",
+        "Description": description if description else ""
+    }
+
+# Benchmark mode works on a labelled sample and never touches Outlook
+if args.benchmark:
+    model_routing.print_benchmark(model_routing.run_benchmark(model_routing.load_labelled_sample(args.benchmark), benchmark_extract))
+    sys.exit(0)
+
+# Open the mail source (Outlook unless exported mail files were given)
+source = mail_sources.open_source(args.source, args.source_path)
+
+# Watch mode stays up and hands each settled burst of new mail to an incremental run of this script
+if args.watch:
+    watch_folders = [args.folder] if args.folder else source.find_bid_folders(refresh=args.refresh_folders)
+    source.close()
+    if not watch_folders:
+        logging.warning("No folders with 'Bid' in the name were found.")
+        sys.exit(1)
+    watch_mode.watch(lambda: mail_sources.open_source(args.source, args.source_path), watch_folders,
+                     watch_mode.run_command(sys.argv), poll_seconds=args.poll_seconds, debounce_seconds=args.debounce_seconds)
+    sys.exit(0)
+
+# Get emails from a selected folder (named on the command line, or picked from the indexed Bid folders)
+sync_checkpoints = incremental_sync.SyncCheckpoints()
+folder_path = args.folder
+if not folder_path:
+    bid_folders = source.find_bid_folders(refresh=args.refresh_folders)
+    if bid_folders:
+        print("Found the following folders with 'Bid' in the name:")
+        for i, path in enumerate(bid_folders):
+            print(f"{i+1}. {path}")
+
+        selection = int(input("Please enter the number of the folder you want to use: ")) - 1
+        folder_path = bid_folders[selection]
+
+if folder_path:
+    selected_folder = source.open_folder(folder_path)
+
+    # Incremental runs pick up where the folder's checkpoint left off
+    folder_key = f"{source.name}:{folder_path}"
+    checkpoint = sync_checkpoints.get(folder_key) if args.incremental else None
+    if checkpoint:
+        logging.info("Fetching emails received since %s", checkpoint[0])
+        filtered_messages = [message for message in source.messages_after(selected_folder, sync_checkpoints.entry(folder_key))
+                             if sync_checkpoints.is_new(folder_key, message)]
     else:
-        num_emails, start_index = int(user_input), 0
-    
-    filtered_messages = [messages[i] for i in range(start_index, min(start_index + num_emails, len(messages)))]
+        if args.incremental:
+            logging.info("No sync checkpoint for this folder yet; the emails processed now will set it")
+
+        # Ask for the number of most recent emails, or a number of days, to process
+        user_input = args.emails or input("How many recent emails would you like to process? (e.g., '15', '15,200' or '7d' for the last 7 days): ")
+        user_input = user_input.strip().lower()
+
+        # Retrieve emails from the selected folder; the mail store does the sorting and filtering
+        if user_input.endswith("d"):
+            cutoff_date = datetime.now() - timedelta(days=int(user_input[:-1]))
+            filtered_messages = list(source.messages_since(selected_folder, cutoff_date))
+        else:
+            if "," in user_input:
+                num_emails, start_index = map(int, user_input.split(","))
+            else:
+                num_emails, start_index = int(user_input), 0
+            filtered_messages = list(source.recent_messages(selected_folder, num_emails, start_index))
 
     logging.info("Processing %d emails after filtering.", len(filtered_messages))
     messages = filtered_messages
 
+    # Backends that can (IMAP) start loading bodies in parallel while the first ones are processed
+    source.prefetch(messages)
+
 else:
     logging.warning("No folders with 'Bid' in the name were found.")
     messages = []
 
-# Collect extracted data
+if args.incremental and not messages:
+    logging.info("No new emails since the last sync.")
+    if source.supports_categories:
+        category_writeback.WritebackQueue().apply(source)
+    source.close()
+    sys.exit(0)
+
+# Read subject and body once, keyed by message ID so results map back to each message.
+# Bodies are reduced to the invite itself before any prompt is built.
+footer_store = body_reduction.FooterStore()
+reduction_report = body_reduction.ReductionReport()
+windowing_report = body_windowing.WindowingReport()
+messages_by_id = {}
+# Messages read by fetch_message that reduce_message hasn't finished yet
+fetched_messages = {}
+full_bodies = {}
+result_store = resilience.ResultStore()
+
+# Function to persist each successful extraction as soon as it arrives
+def remember_result(entry_id, result):
+    if result is not None:
+        result_store.add(entry_id, result)
+
+attachment_reader = attachment_text.AttachmentReader() if args.attachments else None
+
+html_report = html_text.HtmlConversionReport()
+
+# Function to read one message from the mail source (on the thread that owns it)
+def fetch_message(message):
+    # With --html-body the HTML is read here and converted in reduce_message; plain-text emails still use Body
+    html = message.html_body if args.html_body else None
+    body = "" if html else message.body
+    attachments = attachment_reader.load(message.attachments) if attachment_reader else []
+    fetched = (message.id, message.subject, body, html, message.sender, attachments)
+    fetched_messages[message.id] = message
+    return fetched
+
+# Function to reduce and window one email's body, adding any attachment text after the reduced body
+def reduce_message(fetched):
+    entry_id, subject, body, html, sender, attachments = fetched
+    if html:
+        body = html_report.convert(html)
+    if not args.full_body:
+        footer_store.observe(sender, body)
+        reduced_body = body_reduction.reduce_body(body, sender, footer_store)
+        reduction_report.add(subject, body, reduced_body)
+        body = reduced_body
+    if attachments:
+        text = attachment_reader.text(attachments)
+        if text:
+            body = f"{body}\n\n{text}"
+    if args.window_tokens:
+        # Keep the full body in case the windowed prompt misses a required field
+        windowed_body = body_windowing.window_body(body, args.window_tokens)
+        windowing_report.add(body, windowed_body)
+        if windowed_body != body:
+            full_bodies[entry_id] = body
+            body = windowed_body
+    # Only emails that made it this far count as handled; one that failed to read or reduce holds the sync checkpoint back
+    messages_by_id[entry_id] = fetched_messages.pop(entry_id)
+    return entry_id, subject, body
+
+if args.pipeline:
+    # Fetch, reduce, filter, extract and store run as overlapping stages joined by bounded queues
+    relevance = relevance_filter.RelevanceFilter(args.relevance_threshold) if args.relevance_filter else None
+    relevance_scores = {}
+    relevance_skipped = []
+
+    # Function to drop emails the relevance classifier scores as non-bids
+    def filter_job(job):
+        if relevance is None or relevance.classifier is None:
+            return job
+        score = relevance.score([job])[job[0]]
+        relevance_scores[job[0]] = score
+        if score < relevance.threshold:
+            relevance_skipped.append(job)
+            return None
+        return job
+
+    # Function to extract one email, reusing stored results and retrying windowed prompts with the full body
+    def extract_job(job):
+        entry_id, subject, body = job
+        if entry_id in result_store:
+            return job, result_store.get(entry_id), True
+        try:
+            result = extract_routed(subject, body) if args.route else extract_email_info(subject, body)
+            if entry_id in full_bodies and body_windowing.missing_required(result):
+                logging.info("Windowed prompt missed required fields for '%s', retrying with the full body", subject)
+                windowing_report.fallbacks += 1
+                result = extract_email_info(subject, full_bodies[entry_id]) or result
+        except Exception as e:
+            # Keep the email as failed so it stays unmarked and holds back the sync checkpoint
+            logging.error("Failed to extract email with subject '%s': %s", subject, e)
+            result = None
+        return job, result, False
+
+    # Function to persist each result as it leaves the pipeline
+    def store_result(item):
+        job, result, stored = item
+        if not stored:
+            remember_result(job[0], result)
+        return item
+
+    stages = [pipeline.Stage("fetch", fetch_message), pipeline.Stage("reduce", reduce_message)]
+    if relevance is not None:
+        stages.append(pipeline.Stage("filter", filter_job))
+    stages += [pipeline.Stage("extract", extract_job, workers=args.concurrency), pipeline.Stage("store", store_result)]
+    outputs, _ = pipeline.run_pipeline(messages, stages)
+
+    jobs = [job for job, _, _ in outputs]
+    extracted = {job[0]: result for job, result, _ in outputs}
+    stored_results = {job[0]: result for job, result, stored in outputs if stored}
+    duplicate_ids = set()
+    local_extracted = {}
+    if relevance is not None and relevance.classifier is not None:
+        relevance.write_report(relevance_skipped, relevance_scores)
+        logging.info("Relevance filter kept %d of %d emails (threshold %.2f)", len(jobs), len(jobs) + len(relevance_skipped), relevance.threshold)
+    if args.route:
+        logging.info("Model routing: %s", routing_stats.summary())
+    if windowing_report.emails:
+        windowing_report.log()
+else:
+    jobs = []
+    for index, message in enumerate(messages):
+        try:
+            jobs.append(reduce_message(fetch_message(message)))
+        except Exception as e:
+            logging.error("Failed to read email at position %d: %s", index, e)
+
+    # Drop obvious non-bids (replies, newsletters, addenda chatter) before any extraction
+    if args.relevance_filter and jobs:
+        jobs = relevance_filter.RelevanceFilter(args.relevance_threshold).filter(jobs)
+
+    # Results completed by an earlier, interrupted run are reused; only the rest are extracted again
+    stored_results = {entry_id: result_store.get(entry_id) for entry_id, _, _ in jobs if entry_id in result_store}
+    pending_jobs = [job for job in jobs if job[0] not in stored_results]
+
+    # Collapse near-duplicate copies (other platforms, reminders, re-forwards) so each invite is extracted once
+    duplicate_groups = []
+    duplicate_ids = set()
+    if args.dedup and pending_jobs:
+        duplicate_groups = near_duplicates.find_duplicate_groups(pending_jobs)
+        near_duplicates.report_dedup(duplicate_groups)
+        pending_jobs = [group[0] for group in duplicate_groups]
+        duplicate_ids = {entry_id for group in duplicate_groups for entry_id, _, _ in group[1:]}
+
+    # Answer what the local NER model can before spending any API calls
+    local_extracted = {}
+    llm_jobs = pending_jobs
+    if args.cascade and pending_jobs:
+        local_extracted, llm_jobs = ner_cascade.run_local_tier(pending_jobs, ner_cascade.LocalExtractor(), args.ner_threshold)
+
+    # Extract the rest through the Batch API, with several requests in flight, or one at a time
+    if args.backfill and llm_jobs:
+        if args.batch_endpoint == "local":
+            endpoint = batch_backfill.LocalBatchEndpoint()
+        else:
+            endpoint = batch_backfill.OpenAIBatchEndpoint(openai.api_key)
+        batch_results = batch_backfill.run_backfill(llm_jobs, build_request_body, endpoint, is_valid=extraction_schema.is_valid_record)
+        extracted = {}
+        for entry_id, subject, body in llm_jobs:
+            content = batch_results.get(entry_id)
+            if content is None:
+                logging.error("No batch result for email with subject '%s'", subject)
+                continue
+            try:
+                extracted[entry_id] = parse_extraction(content)
+            except extraction_schema.SchemaError as e:
+                # One targeted live repair, as for live extractions; if that fails too the next backfill resubmits the email
+                logging.warning("Invalid batch result for '%s' (%s), requesting a repair", subject, e)
+                metrics.count_repair()
+                try:
+                    content = create_completion(subject, build_repair_body(build_request_body(subject, body), content, e), emails=0)
+                    extracted[entry_id] = parse_extraction(content)
+                except Exception as repair_error:
+                    logging.error("Repair failed for email with subject '%s': %s", subject, repair_error)
+                    continue
+            remember_result(entry_id, extracted[entry_id])
+            # Store batch answers in the response cache so later live runs reuse them
+            response_cache.put(make_cache_key(subject, body, MODEL, SYSTEM_PROMPT + USER_PROMPT, MAX_TOKENS), content)
+    elif args.concurrency > 1 and llm_jobs:
+        extracted = asyncio.run(async_extraction.run_concurrent(
+            llm_jobs,
+            extract_routed_async if args.route else extract_email_info_async,
+            estimate_tokens,
+            rate_limit_errors=(openai.error.RateLimitError,),
+            max_concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            on_rate_limit=metrics.count_retry,
+            on_result=remember_result
+        ))
+    elif args.pack and llm_jobs:
+        extracted = extract_packed(llm_jobs, on_result=remember_result)
+    else:
+        extracted = {}
+        for entry_id, subject, body in llm_jobs:
+            extracted[entry_id] = extract_routed(subject, body) if args.route else extract_email_info(subject, body)
+            remember_result(entry_id, extracted[entry_id])
+    if args.route:
+        logging.info("Model routing: %s", routing_stats.summary())
+
+    extracted.update(local_extracted)
+
+    # Windowed emails missing a required field are extracted again from the full body
+    for entry_id, subject, body in pending_jobs:
+        if entry_id in full_bodies and body_windowing.missing_required(extracted.get(entry_id)):
+            logging.info("Windowed prompt missed required fields for '%s', retrying with the full body", subject)
+            windowing_report.fallbacks += 1
+            result = extract_email_info(subject, full_bodies[entry_id])
+            if result is not None:
+                extracted[entry_id] = result
+                remember_result(entry_id, result)
+    if windowing_report.emails:
+        windowing_report.log()
+
+    # Fan each group's result out to every copy
+    for group in duplicate_groups:
+        result = extracted.get(group[0][0])
+        for entry_id, _, _ in group[1:]:
+            extracted[entry_id] = result
+            remember_result(entry_id, result)
+
+if html_report.emails:
+    html_report.log()
+if attachment_reader:
+    attachment_reader.log()
+
+if reduction_report.rows:
+    logging.info("Body reduction: %s", reduction_report.totals())
+    reduction_report.save()
+    footer_store.save()
+
+# Record which tier answered each email
+for entry_id, subject, body in jobs:
+    if entry_id in stored_results:
+        metrics.record_tier(subject, "stored")
+    elif entry_id in duplicate_ids:
+        metrics.record_tier(subject, "duplicate")
+    else:
+        metrics.record_tier(subject, "ner" if entry_id in local_extracted else "llm")
+extracted.update(stored_results)
+
+# Collect extracted data; emails whose extraction failed are left unmarked so the next run retries them
 email_data = []
-for message in messages:
+written_ids = []
+writeback_queue = category_writeback.WritebackQueue()
+for entry_id, subject, body in jobs:
     try:
-        logging.info("Processing email with subject: %s", message.Subject)
-        subject = message.Subject
-        body = message.Body
-        project_name, contractor, bid_due_date, job_walk, description = extract_email_info(subject, body)
-
-        # Normalize bid due date
-        bid_due_date = normalize_date(bid_due_date) if bid_due_date else "01/01/11**"
-
-        # Apply corrections if available
-        if project_name in corrections:
-            corrected_info = corrections[project_name]
-            contractor = corrected_info.get("Contractor", contractor)
-            bid_due_date = corrected_info.get("Bid Due Date", bid_due_date)
-            
-        # Mark email with Orange category
-        message.Categories = "Orange Category"
-        message.Save()
-        logging.info("Marked email with subject '%s' as Orange Category.", message.Subject)    
+        logging.info("Processing email with subject: %s", subject)
+        if extracted.get(entry_id) is None:
+            logging.warning("Extraction failed for '%s', leaving it unmarked for the next run", subject)
+            continue
+        project_name, contractor, bid_due_date, job_walk, description = extracted[entry_id]
+        record = finalize_record(project_name, contractor, bid_due_date, job_walk, description)
+
+        # Queue the email for the Orange category; it is tagged once the calendar is saved
+        if source.supports_categories:
+            writeback_queue.add(entry_id)
 
         # Add extracted information to email data list
-        email_data.append({
-            "Project Name": project_name,
-            "Contractor": contractor,
-            "Bid Due Date": bid_due_date if bid_due_date != "Not specified" else "",
-            "Job Walk": job_walk if job_walk else "",
-            "Description": description if description else ""
-        })
+        email_data.append(record)
+        written_ids.append(entry_id)
     except Exception as e:
-        logging.error("Failed to process email with subject '%s': %s", message.Subject, e)
+        logging.error("Failed to process email with subject '%s': %s", subject, e)
+
+# Report cache usage and apply size/age eviction
+logging.info("Response cache: %s", response_cache.stats())
+response_cache.prune()
+response_cache.save_stats()
+
+# Write the token, latency and cost summary for this run
+if not args.backfill:
+    metrics.save()
 
-# Convert to DataFrame
-email_df = pd.DataFrame(email_data)
+# Convert to DataFrame (with the columns even when nothing new was extracted, as in a quiet --watch run)
+email_df = pd.DataFrame(email_data, columns=["Project Name", "Contractor", "Bid Due Date", "Job Walk", "Description"])
+
+# Contractors sharing a project are listed in one cell with this separator; commas can't be used
+# since they appear inside legal names ("Zeta Builders, Inc.")
+CONTRACTOR_SEPARATOR = "; "
+
+# Function to list the unique contractors across calendar cells, keeping each name whole
+def join_contractors(values):
+    names = {name.strip() for value in values if value for name in str(value).split(CONTRACTOR_SEPARATOR.strip())}
+    return CONTRACTOR_SEPARATOR.join(sorted(filter(None, names)))
 
 # Consolidate identical projects and list unique contractors
 consolidated_data = (
     email_df.groupby("Project Name", as_index=False)
     .agg({
         "Bid Due Date": "first",
-        "Contractor": lambda x: ", ".join(sorted(set(filter(None, [c.strip() for c in x])))),
+        "Contractor": join_contractors,
         "Job Walk": "first",
         "Description": "first"
     })
 )
 
-# Save to Excel file
+# Function to keep the newest filled-in value of a calendar column
+def latest_value(values):
+    filled = [value for value in values if value and value != "01/01/11**"]
+    return filled[-1] if filled else values.iloc[-1]
+
+# Function to merge this run's projects into the saved calendar; newer details win and contractors are combined
+def upsert_calendar(calendar, calendar_file):
+    try:
+        existing = pd.read_excel(calendar_file, sheet_name='Bid Requests', dtype=str).fillna("")
+    except FileNotFoundError:
+        return calendar
+    combined = pd.concat([existing, calendar.fillna("")], ignore_index=True)
+    merged = (
+        combined.groupby("Project Name", as_index=False, sort=False)
+        .agg({
+            "Bid Due Date": latest_value,
+            "Contractor": join_contractors,
+            "Job Walk": latest_value,
+            "Description": latest_value
+        })
+    )
+    logging.info("Calendar upsert: %d saved projects, %d from this run, %d after merging", len(existing), len(calendar), len(merged))
+    return merged
+
+# Save to Excel file; the new file replaces the old one in one step so an interrupted save can't lose the calendar
 output_file = "bid_requests_calendar.xlsx"
+# Incremental runs only see new mail, so replacing the calendar would drop every earlier project
+if args.upsert or args.incremental:
+    consolidated_data = upsert_calendar(consolidated_data, output_file)
 logging.info("Saving data to Excel file: %s", output_file)
-with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+tmp_output_file = f"{output_file}.tmp.xlsx"
+with pd.ExcelWriter(tmp_output_file, engine='openpyxl') as writer:
     consolidated_data.to_excel(writer, sheet_name='Bid Requests', index=False)
+os.replace(tmp_output_file, output_file)
 logging.info("Data successfully saved to %s", output_file)
+
+# Tag the saved emails in one pass; anything that fails stays queued for the next run
+if source.supports_categories:
+    writeback_queue.apply(source, messages_by_id)
+
+# Stored results are no longer needed once their emails are marked and saved
+result_store.discard(written_ids)
+
+# Move the folder's checkpoint past everything handled; failed emails hold it back so they are fetched again
+if args.incremental and messages:
+    failed_ids = {entry_id for entry_id, _, _ in jobs} - set(written_ids)
+    sync_checkpoints.advance(folder_key, messages, set(messages_by_id) - failed_ids)
+    sync_checkpoints.save()
+
+source.close()
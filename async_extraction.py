@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+
+# Default budgets for concurrent extraction (adjust to the account's rate limits)
+MAX_CONCURRENCY = 8
+REQUESTS_PER_MINUTE = 300
+TOKENS_PER_MINUTE = 150000
+MAX_RATE_LIMIT_RETRIES = 6
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute.
+    acquire(amount) waits until enough budget is available.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate_per_second = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_second)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        # A single request larger than the whole budget still has to go through eventually
+        amount = min(float(amount), self.capacity)
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate_per_second)
+
+
+class AdaptiveConcurrency:
+    """
+    Limits the number of in-flight requests. The limit is halved on every
+    rate-limit response and grows by one after a full window of successes.
+    """
+
+    def __init__(self, maximum, minimum=1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = maximum
+        self.in_flight = 0
+        self.successes = 0
+        self.backoff = 0.0
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        # Honour any backoff triggered by a recent 429
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def record_success(self):
+        async with self.condition:
+            self.successes += 1
+            self.backoff = 0.0
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                logging.info("No rate limiting, raising concurrency to %d", self.limit)
+                self.condition.notify_all()
+
+    async def record_rate_limit(self):
+        async with self.condition:
+            self.successes = 0
+            self.limit = max(self.minimum, self.limit // 2)
+            self.backoff = min(60.0, self.backoff * 2 if self.backoff else 1.0)
+            self.paused_until = max(self.paused_until, time.monotonic() + self.backoff)
+            logging.warning("Rate limited, lowering concurrency to %d and backing off %.1fs", self.limit, self.backoff)
+
+
+# Function to run worker(subject, body) for every job with bounded, rate-limited concurrency
+async def run_concurrent(jobs, worker, estimate_tokens, rate_limit_errors=(), max_concurrency=MAX_CONCURRENCY,
+                         requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE, on_rate_limit=None,
+                         on_result=None):
+    """
+    jobs is a list of (job_id, subject, body). Returns a dict mapping each
+    job_id to the worker's result, or to None if it kept getting rate limited.
+    on_rate_limit(subject) is called before each rate-limited job is retried,
+    and on_result(job_id, result) as soon as each job finishes.
+    """
+    request_bucket = TokenBucket(requests_per_minute)
+    token_bucket = TokenBucket(tokens_per_minute)
+    concurrency = AdaptiveConcurrency(max_concurrency)
+    results = {}
+
+    async def run_job(job_id, subject, body):
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            async with concurrency:
+                await request_bucket.acquire(1)
+                await token_bucket.acquire(estimate_tokens(subject, body))
+                try:
+                    result = await worker(subject, body)
+                except rate_limit_errors:
+                    await concurrency.record_rate_limit()
+                    if on_rate_limit:
+                        on_rate_limit(subject)
+                    continue
+            await concurrency.record_success()
+            results[job_id] = result
+            if on_result:
+                on_result(job_id, result)
+            return
+        logging.error("Giving up on email with subject '%s' after %d rate-limited attempts", subject, MAX_RATE_LIMIT_RETRIES + 1)
+        results[job_id] = None
+
+    started = time.monotonic()
+    await asyncio.gather(*(run_job(job_id, subject, body) for job_id, subject, body in jobs))
+    logging.info("Extracted %d emails concurrently in %.1fs", len(jobs), time.monotonic() - started)
+    return results
@@ -0,0 +1,174 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+from response_cache import ResponseCache
+
+# pypdf is only needed for PDF attachments; without it they are skipped
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Extracted text is cached by attachment hash, since the same ITB is re-attached to every reminder
+CACHE_DIR = "attachment_cache"
+# Attachments larger than this are not read at all (plan sets, photos)
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+# Text kept per attachment; reading stops once it is reached
+MAX_TEXT_CHARS = 6000
+# Attachments per email that are read
+MAX_ATTACHMENTS = 3
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+# Function to work out which reader handles an attachment, from its file name
+def attachment_kind(filename):
+    extension = os.path.splitext(filename or "")[1].lower()
+    return {".pdf": "pdf", ".docx": "docx", ".xlsx": "xlsx"}.get(extension)
+
+# Function to read text from a PDF page by page until the cap is reached
+def pdf_text(data, max_chars=MAX_TEXT_CHARS):
+    if PdfReader is None:
+        raise RuntimeError("pypdf is not installed")
+    pieces, used = [], 0
+    for page in PdfReader(io.BytesIO(data)).pages:
+        text = page.extract_text() or ""
+        pieces.append(text)
+        used += len(text)
+        if used >= max_chars:
+            break
+    return "\n".join(pieces)[:max_chars]
+
+# Function to stream paragraph and table text out of a DOCX until the cap is reached
+def docx_text(data, max_chars=MAX_TEXT_CHARS):
+    pieces, used, cell_depth = [], 0, 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive, archive.open("word/document.xml") as document:
+        for event, element in ElementTree.iterparse(document, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                if tag == f"{WORD_NAMESPACE}tc":
+                    cell_depth += 1
+                continue
+            if tag == f"{WORD_NAMESPACE}t" and element.text:
+                pieces.append(element.text)
+                used += len(element.text)
+            elif tag == f"{WORD_NAMESPACE}tab":
+                pieces.append("\t")
+            elif tag == f"{WORD_NAMESPACE}p":
+                # Paragraphs inside a table cell stay on the row's line
+                pieces.append(" " if cell_depth else "\n")
+                element.clear()
+            elif tag == f"{WORD_NAMESPACE}tc":
+                cell_depth -= 1
+                pieces.append("| ")
+            elif tag == f"{WORD_NAMESPACE}tr":
+                pieces.append("\n")
+            if used >= max_chars:
+                break
+    text = re.sub(r" *\| *\n", "\n", "".join(pieces))
+    return re.sub(r"[ \t]{2,}", " ", text)[:max_chars]
+
+# Function to read an XLSX row by row until the cap is reached
+def xlsx_text(data, max_chars=MAX_TEXT_CHARS):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    pieces, used = [], 0
+    try:
+        for sheet in workbook.worksheets:
+            pieces.append(f"[{sheet.title}]")
+            for row in sheet.iter_rows(values_only=True):
+                line = " | ".join(str(value) for value in row if value is not None)
+                if line:
+                    pieces.append(line)
+                    used += len(line)
+                if used >= max_chars:
+                    return "\n".join(pieces)[:max_chars]
+    finally:
+        workbook.close()
+    return "\n".join(pieces)[:max_chars]
+
+READERS = {"pdf": pdf_text, "docx": docx_text, "xlsx": xlsx_text}
+
+
+class AttachmentReader:
+    """
+    Pulls text out of PDF, DOCX and XLSX attachments for extraction.
+
+    load() reads the attachment bytes and must run where the mail source
+    lives (the COM thread for Outlook); cached attachments are resolved there
+    and only misses carry their bytes on. text() parses the misses, caches
+    them, and returns the text to append to the email body.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_ATTACHMENT_BYTES, max_chars=MAX_TEXT_CHARS, max_attachments=MAX_ATTACHMENTS):
+        self.cache = ResponseCache(cache_dir=cache_dir)
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.max_attachments = max_attachments
+        self.counts = {"read": 0, "cached": 0, "parsed": 0, "too_large": 0, "failed": 0}
+        # Text parsed this run, so copies loaded before the first was parsed aren't parsed again
+        self.parsed = {}
+
+    def load(self, attachments):
+        """
+        Returns a list of (filename, key, cached text or None, bytes or None).
+        """
+        loaded = []
+        for attachment in attachments:
+            kind = attachment_kind(attachment.filename)
+            if kind is None:
+                continue
+            if len(loaded) >= self.max_attachments:
+                break
+            if attachment.size and attachment.size > self.max_bytes:
+                self.counts["too_large"] += 1
+                logging.info("Skipping attachment '%s' (%d bytes, over the %d byte cap)", attachment.filename, attachment.size, self.max_bytes)
+                continue
+            try:
+                data = attachment.read()
+            except Exception as e:
+                self.counts["failed"] += 1
+                logging.warning("Could not read attachment '%s': %s", attachment.filename, e)
+                continue
+            self.counts["read"] += 1
+            key = hashlib.sha256(data).hexdigest()
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.counts["cached"] += 1
+                loaded.append((attachment.filename, key, cached, None))
+            else:
+                loaded.append((attachment.filename, key, None, data))
+        return loaded
+
+    def text(self, loaded):
+        """
+        Returns the attachments' text as one block, one section per attachment.
+        """
+        sections = []
+        for filename, key, text, data in loaded:
+            if text is None:
+                text = self.parsed.get(key)
+            if text is None:
+                try:
+                    text = READERS[attachment_kind(filename)](data, self.max_chars).strip()
+                except Exception as e:
+                    self.counts["failed"] += 1
+                    logging.warning("Could not extract text from attachment '%s': %s", filename, e)
+                    continue
+                self.counts["parsed"] += 1
+                self.parsed[key] = text
+                self.cache.put(key, text)
+            if text:
+                sections.append(f"=== Attachment: {filename} ===\n{text}")
+        return "\n\n".join(sections)
+
+    def log(self):
+        logging.info("Attachment text: %s", self.counts)
+        self.cache.prune()
+        self.cache.save_stats()
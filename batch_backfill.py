@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+
+import requests
+
+# Defaults for backfill runs
+STATE_FILE = "backfill_state.json"
+BATCH_DIR = "batches"
+POLL_INTERVAL = 60
+MAX_REQUESTS_PER_BATCH = 50000
+COMPLETION_ENDPOINT = "/v1/chat/completions"
+
+# Batch states that will not change any more
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# Function to write one JSONL request file in the batch input format
+def write_batch_file(path, batch_requests):
+    with open(path, "w", encoding="utf-8") as file:
+        for custom_id, body in batch_requests:
+            file.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": COMPLETION_ENDPOINT,
+                "body": body
+            }, ensure_ascii=False) + "\n")
+
+# Function to read a batch output file into {custom_id: response text or None}
+def read_batch_results(path):
+    results = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                logging.warning("Batch request %s failed: %s", custom_id, record.get("error") or response.get("status_code"))
+                results[custom_id] = None
+                continue
+            try:
+                results[custom_id] = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                logging.warning("Batch request %s returned an unexpected body", custom_id)
+                results[custom_id] = None
+    return results
+
+
+class OpenAIBatchEndpoint:
+    """
+    Submits batch files to the OpenAI Batch API.
+    """
+
+    def __init__(self, api_key, base_url="https://api.openai.com/v1"):
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+
+    def submit(self, input_path):
+        with open(input_path, "rb") as file:
+            upload = requests.post(f"{self.base_url}/files", headers=self.headers,
+                                   files={"file": file}, data={"purpose": "batch"}, timeout=300)
+        upload.raise_for_status()
+        batch = requests.post(f"{self.base_url}/batches", headers=self.headers, timeout=60, json={
+            "input_file_id": upload.json()["id"],
+            "endpoint": COMPLETION_ENDPOINT,
+            "completion_window": "24h"
+        })
+        batch.raise_for_status()
+        return batch.json()["id"]
+
+    def status(self, batch_id):
+        response = requests.get(f"{self.base_url}/batches/{batch_id}", headers=self.headers, timeout=60)
+        response.raise_for_status()
+        batch = response.json()
+        return batch["status"], batch.get("output_file_id")
+
+    def download(self, output_id, path):
+        response = requests.get(f"{self.base_url}/files/{output_id}/content", headers=self.headers, timeout=300)
+        response.raise_for_status()
+        with open(path, "wb") as file:
+            file.write(response.content)
+
+
+# Function used by the local endpoint to answer a request without calling the API
+def echo_responder(body):
+    prompt = body["messages"][-1]["content"]
+    match = re.search(r"^Subject: (.*)$", prompt, flags=re.MULTILINE)
+    subject = match.group(1).strip() if match else ""
+    return json.dumps({"project_name": subject, "contractor": None, "bid_due_date": None, "job_walk": None, "description": None})
+
+
+class LocalBatchEndpoint:
+    """
+    File-based stand-in for the Batch API, for testing backfills offline.
+    A submitted batch completes on its first status check; responder(body)
+    produces the completion text for each request.
+    """
+
+    def __init__(self, batch_dir=os.path.join(BATCH_DIR, "local_endpoint"), responder=echo_responder):
+        self.batch_dir = batch_dir
+        self.responder = responder
+        os.makedirs(self.batch_dir, exist_ok=True)
+
+    def submit(self, input_path):
+        batch_id = f"local_batch_{uuid.uuid4().hex[:12]}"
+        shutil.copyfile(input_path, os.path.join(self.batch_dir, f"{batch_id}_input.jsonl"))
+        return batch_id
+
+    def status(self, batch_id):
+        input_path = os.path.join(self.batch_dir, f"{batch_id}_input.jsonl")
+        output_path = os.path.join(self.batch_dir, f"{batch_id}_output.jsonl")
+        if not os.path.exists(input_path):
+            return "failed", None
+        if not os.path.exists(output_path):
+            with open(input_path, "r", encoding="utf-8") as source, open(output_path, "w", encoding="utf-8") as output:
+                for line in source:
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)
+                    content = self.responder(request["body"])
+                    output.write(json.dumps({
+                        "custom_id": request["custom_id"],
+                        "response": {"status_code": 200, "body": {"choices": [{"message": {"role": "assistant", "content": content}}]}},
+                        "error": None
+                    }, ensure_ascii=False) + "\n")
+        return "completed", output_path
+
+    def download(self, output_id, path):
+        shutil.copyfile(output_id, path)
+
+
+# Function to load the saved backfill state, or start a new one
+def load_state(state_path=STATE_FILE):
+    try:
+        with open(state_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {"batches": []}
+
+# Function to save the backfill state so an interrupted run can resume
+def save_state(state, state_path=STATE_FILE):
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=4)
+    os.replace(tmp_path, state_path)
+
+
+# Function to run a resumable backfill: submit anything not yet submitted, wait for every batch, and return all results
+def run_backfill(jobs, build_body, endpoint, state_path=STATE_FILE, batch_dir=BATCH_DIR, poll_interval=POLL_INTERVAL, is_valid=None):
+    """
+    jobs is a list of (custom_id, subject, body) where custom_id is a stable
+    message ID. Returns {custom_id: response text or None} for every job
+    found in a finished batch, including batches from earlier runs.
+    is_valid(content), if given, marks answers that are no use (invalid
+    JSON, wrong schema) so they are submitted again like failed requests.
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    state = load_state(state_path)
+
+    # Only submit messages that are not already part of a live batch; requests that
+    # failed or came back invalid inside a finished batch, or whose batch failed, are submitted again
+    submitted = set()
+    for batch in state["batches"]:
+        if batch["status"] in FINAL_STATUSES and not batch.get("output_file"):
+            continue
+        submitted.update(batch["custom_ids"])
+        if batch.get("output_file") and os.path.exists(batch["output_file"]):
+            submitted.difference_update(
+                custom_id for custom_id, content in read_batch_results(batch["output_file"]).items()
+                if content is None or (is_valid is not None and not is_valid(content))
+            )
+    pending = [job for job in jobs if job[0] not in submitted]
+    logging.info("Backfill: %d emails already submitted, %d new", len(jobs) - len(pending), len(pending))
+
+    for start in range(0, len(pending), MAX_REQUESTS_PER_BATCH):
+        chunk = pending[start:start + MAX_REQUESTS_PER_BATCH]
+        input_path = os.path.join(batch_dir, f"batch_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}.jsonl")
+        write_batch_file(input_path, [(custom_id, build_body(subject, body)) for custom_id, subject, body in chunk])
+        batch_id = endpoint.submit(input_path)
+        state["batches"].append({
+            "id": batch_id,
+            "input_file": input_path,
+            "status": "submitted",
+            "output_file": None,
+            "custom_ids": [custom_id for custom_id, _, _ in chunk]
+        })
+        save_state(state, state_path)
+        logging.info("Backfill: submitted batch %s with %d requests", batch_id, len(chunk))
+
+    # Poll every unfinished batch until it completes, downloading results as they arrive
+    while True:
+        waiting = 0
+        for batch in state["batches"]:
+            if batch["status"] in FINAL_STATUSES:
+                continue
+            status, output_id = endpoint.status(batch["id"])
+            if status == "completed" and output_id:
+                output_path = os.path.join(batch_dir, f"{batch['id']}_output.jsonl")
+                endpoint.download(output_id, output_path)
+                batch["output_file"] = output_path
+                logging.info("Backfill: batch %s completed", batch["id"])
+            elif status in FINAL_STATUSES:
+                logging.error("Backfill: batch %s ended with status '%s'", batch["id"], status)
+            else:
+                waiting += 1
+            batch["status"] = status
+            save_state(state, state_path)
+        if not waiting:
+            break
+        logging.info("Backfill: %d batches still running, checking again in %ds", waiting, poll_interval)
+        time.sleep(poll_interval)
+
+    # Later batches win, so a resubmitted request replaces its earlier failure
+    results = {}
+    for batch in state["batches"]:
+        if batch.get("output_file") and os.path.exists(batch["output_file"]):
+            for custom_id, content in read_batch_results(batch["output_file"]).items():
+                if content is not None or custom_id not in results:
+                    results[custom_id] = content
+    return results
@@ -0,0 +1,218 @@
+import csv
+import hashlib
+import json
+import logging
+import re
+
+# Where footers learned from recurring senders are kept between runs
+FOOTER_PATTERNS_FILE = "footer_patterns.json"
+# How many emails from one sender must end with the same block before it is treated as a footer
+FOOTER_MIN_OCCURRENCES = 3
+# How many trailing paragraphs are considered as footer candidates
+FOOTER_CANDIDATE_PARAGRAPHS = 2
+# Signature blocks longer than this many lines are left alone
+MAX_SIGNATURE_LINES = 12
+
+# Headers that start quoted history in replies and forwards
+QUOTE_MARKERS = re.compile(
+    r"^(?:-{2,}\s*Original Message\s*-{2,}"
+    r"|-{2,}\s*Forwarded message\s*-{2,}"
+    r"|_{10,}"
+    r"|From:\s.+\n(?:.*\n){0,3}?\s*(?:Sent|Date):\s.+"
+    r"|On .{5,200}wrote:)\s*$",
+    flags=re.IGNORECASE | re.MULTILINE
+)
+
+# Lines that usually open a signature block
+SIGN_OFF = re.compile(
+    r"^\s*(?:--|thanks?(?: you)?|thank you(?: for your time)?|regards|best(?: regards)?|kind regards|sincerely|cheers|respectfully)[,!.]?\s*$",
+    flags=re.IGNORECASE
+)
+
+# Disclaimers and boilerplate seen across many senders
+BOILERPLATE = [
+    re.compile(r"^\s*(?:CONFIDENTIALITY NOTICE|DISCLAIMER|PRIVILEGED AND CONFIDENTIAL)\b.*?(?:\n\s*\n|\Z)", flags=re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    re.compile(r"^\s*This (?:e-?mail|message)(?: and any (?:files|attachments)[^.]*)? (?:is|are|may be) (?:confidential|intended solely).*?(?:\n\s*\n|\Z)", flags=re.IGNORECASE | re.MULTILINE | re.DOTALL),
+    re.compile(r"^.*\b(?:unsubscribe|manage your (?:email )?preferences)\b.*$", flags=re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^\s*Sent from my (?:iPhone|iPad|Android|mobile device).*$", flags=re.IGNORECASE | re.MULTILINE),
+]
+
+# Words that show a quoted message still carries the invite itself
+BID_KEYWORDS = re.compile(r"\b(?:bid|proposal|due|invitation|itb|rfp|job walk|pre-bid)\b", flags=re.IGNORECASE)
+
+
+# Dates such as 6/15, 06-15-2026 or June 15, which belong to the invite and never to a footer
+DATE_PATTERN = re.compile(
+    r"\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2}\b",
+    flags=re.IGNORECASE
+)
+
+# Signature lines that carry contact details rather than who sent the invite
+SIGNATURE_DETAIL = re.compile(
+    r"@|https?://|www\.|\[(?:cid|image)|\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}"
+    r"|^\s*(?:(?:tel|phone|office|cell|mobile|fax|direct)\s*[:.]|[ocfm]\s*:)"
+    r"|^\s*\d+\s+\w+.*\b(?:st|street|ave|avenue|rd|road|blvd|dr|drive|way|suite|ste)\b"
+    r"|,\s*[A-Z]{2}\s+\d{5}",
+    flags=re.IGNORECASE
+)
+
+
+# Function to tell whether text carries invite details (bid wording or a date)
+def has_bid_details(text):
+    return bool(BID_KEYWORDS.search(text) or DATE_PATTERN.search(text))
+
+# Function to estimate tokens the same way the extraction code does
+def estimate_tokens(text):
+    return len(text or "") // 4
+
+# Function to get the sender's domain, used to group learned footers
+def sender_key(sender):
+    sender = (sender or "").strip().lower()
+    return sender.rsplit("@", 1)[-1] if "@" in sender else sender
+
+
+class FooterStore:
+    """
+    Footers learned from recurring senders, saved in footer_patterns.json.
+    A trailing block becomes a footer once it has been seen at the end of
+    FOOTER_MIN_OCCURRENCES different emails from the same sender domain.
+    Emails are told apart by their text, so re-running a window or getting
+    reminder copies of one invite doesn't count twice, and blocks with bid
+    wording or dates are never learned.
+    """
+
+    def __init__(self, path=FOOTER_PATTERNS_FILE):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.senders = json.load(file)
+        except (FileNotFoundError, ValueError):
+            self.senders = {}
+
+    def footers(self, sender):
+        # Footers learned before invite details were excluded are skipped as well
+        return [footer for footer in self.senders.get(sender_key(sender), {}).get("footers", []) if not has_bid_details(footer)]
+
+    def observe(self, sender, body):
+        key = sender_key(sender)
+        if not key:
+            return
+        entry = self.senders.setdefault(key, {"footers": [], "candidates": {}})
+        # Only the newest message's own tail is a candidate, not the quoted history
+        newest = split_quoted((body or "").replace("\r\n", "\n"))[0]
+        email_digest = hashlib.sha1(" ".join(newest.split()).encode("utf-8")).hexdigest()
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", newest) if p.strip()]
+        for paragraph in paragraphs[-FOOTER_CANDIDATE_PARAGRAPHS:]:
+            if paragraph in entry["footers"] or len(paragraph) < 40 or has_bid_details(paragraph):
+                continue
+            digest = hashlib.sha1(paragraph.encode("utf-8")).hexdigest()
+            candidate = entry["candidates"].setdefault(digest, {"text": paragraph, "emails": []})
+            emails = candidate.setdefault("emails", [])
+            if email_digest in emails:
+                continue
+            emails.append(email_digest)
+            if len(emails) >= FOOTER_MIN_OCCURRENCES:
+                entry["footers"].append(paragraph)
+                del entry["candidates"][digest]
+                logging.info("Learned a footer for sender '%s' (%d chars)", key, len(paragraph))
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(self.senders, file, indent=4)
+
+
+# Function to split a body into the newest message and the quoted messages under it
+def split_quoted(body):
+    starts = [match.start() for match in QUOTE_MARKERS.finditer(body)]
+    bounds = [0] + starts + [len(body)]
+    segments = [body[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+    # Lines quoted with ">" belong to the history as well
+    segments[0] = "\n".join(line for line in segments[0].split("\n") if not line.lstrip().startswith(">"))
+    return segments
+
+# Function to trim a trailing signature block from one message
+def strip_signature(text):
+    """
+    Drops the sign-off and the contact lines under it (phone, email,
+    address, images) but keeps the name and company, which are often the
+    only place a direct invite names the contractor. A sign-off followed by
+    bid wording or dates isn't a signature, so nothing is cut.
+    """
+    lines = text.rstrip().split("\n")
+    for index in range(len(lines) - 1, -1, -1):
+        if len(lines) - index > MAX_SIGNATURE_LINES:
+            break
+        if SIGN_OFF.match(lines[index]):
+            block = lines[index + 1:]
+            if has_bid_details("\n".join(block)):
+                break
+            kept = [line for line in block if line.strip() and not SIGNATURE_DETAIL.search(line)]
+            return "\n".join(lines[:index] + kept).rstrip()
+    return text.rstrip()
+
+# Function to remove known boilerplate and the sender's learned footers
+def strip_footers(text, footers=()):
+    for footer in footers:
+        text = text.replace(footer, "")
+    for pattern in BOILERPLATE:
+        text = pattern.sub("", text)
+    return text
+
+# Function to reduce a body to the part that carries the invite
+def reduce_body(body, sender=None, footer_store=None):
+    """
+    Keeps the newest message without its signature and footers, plus the
+    first quoted message with bid wording. The quoted one is kept even when
+    the newest message mentions a bid too, since a forwarder's note ("Can
+    you look at this bid?") rarely carries the invite's details.
+    """
+    if not body:
+        return body or ""
+    footers = footer_store.footers(sender) if footer_store else []
+    segments = [strip_signature(strip_footers(segment, footers)) for segment in split_quoted(body.replace("\r\n", "\n"))]
+
+    kept = [segments[0]]
+    for segment in segments[1:]:
+        if BID_KEYWORDS.search(segment):
+            kept.append(segment)
+            break
+
+    reduced = "\n\n".join(segment.strip() for segment in kept if segment.strip())
+    reduced = re.sub(r"\n{3,}", "\n\n", reduced)
+    # Never hand the model an empty body because of an over-eager rule
+    return reduced if reduced.strip() else body
+
+
+class ReductionReport:
+    """
+    Tracks bytes and tokens saved per email and writes them to a CSV report.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, subject, original, reduced):
+        original_bytes = len((original or "").encode("utf-8"))
+        reduced_bytes = len((reduced or "").encode("utf-8"))
+        row = {
+            "Subject": subject,
+            "Original Bytes": original_bytes,
+            "Reduced Bytes": reduced_bytes,
+            "Bytes Saved": original_bytes - reduced_bytes,
+            "Tokens Saved": estimate_tokens(original) - estimate_tokens(reduced)
+        }
+        self.rows.append(row)
+        logging.info("Reduced body for '%s': %d -> %d bytes (~%d tokens saved)", subject, original_bytes, reduced_bytes, row["Tokens Saved"])
+
+    def totals(self):
+        return {
+            "emails": len(self.rows),
+            "bytes_saved": sum(row["Bytes Saved"] for row in self.rows),
+            "tokens_saved": sum(row["Tokens Saved"] for row in self.rows),
+        }
+
+    def save(self, path="body_reduction_report.csv"):
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=["Subject", "Original Bytes", "Reduced Bytes", "Bytes Saved", "Tokens Saved"])
+            writer.writeheader()
+            writer.writerows(self.rows)
@@ -0,0 +1,102 @@
+import logging
+import re
+
+import extraction_schema
+
+# Default prompt cap for the body, in estimated tokens (about 4 characters each)
+WINDOW_TOKEN_CAP = 1500
+# Characters kept before and after each anchor
+WINDOW_BEFORE = 300
+WINDOW_AFTER = 600
+# The project header usually sits in the first lines of the body
+HEADER_CHARS = 400
+
+# Phrases the useful fields sit next to; one alternation so the body is scanned once
+# (the "label:" forms end at the colon, since a space usually follows it)
+ANCHORS = re.compile(
+    r"\b(?:(?:bids? (?:are )?due|due date|proposals? due|job ?walk|site ?walk|walk-?through|pre-?bid|"
+    r"prevailing wage|union|davis[- ]bacon|invitation to bid|bid invit\w*|project name|"
+    r"general contractor|scope of work|bid date)\b|(?:project|owner|location):)",
+    flags=re.IGNORECASE
+)
+
+# Fields that must come back filled; if any is empty the full body is sent instead
+REQUIRED_FIELDS = ("project_name", "contractor", "bid_due_date")
+
+
+# Function to merge overlapping (start, end) ranges
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+# Function to keep only the header and the text around anchor phrases, within a token cap
+def window_body(body, token_cap=WINDOW_TOKEN_CAP):
+    """
+    Returns the body unchanged when it already fits the cap. Otherwise keeps
+    the header plus a window around every anchor, in body order, until the
+    cap is reached; windows are joined with "...".
+    """
+    body = body or ""
+    char_cap = token_cap * 4
+    if len(body) <= char_cap:
+        return body
+
+    ranges = [(0, min(len(body), HEADER_CHARS))]
+    for match in ANCHORS.finditer(body):
+        ranges.append((max(0, match.start() - WINDOW_BEFORE), min(len(body), match.end() + WINDOW_AFTER)))
+
+    pieces = []
+    used = 0
+    for start, end in merge_ranges(ranges):
+        if used >= char_cap:
+            break
+        end = min(end, start + char_cap - used)
+        pieces.append(body[start:end].strip())
+        used += end - start
+    return "\n...\n".join(piece for piece in pieces if piece)
+
+# Function to check whether an extraction is missing any required field
+def missing_required(fields):
+    if fields is None:
+        return True
+    values = dict(zip(extraction_schema.FIELDS, fields))
+    return not all(values[field] for field in REQUIRED_FIELDS)
+
+
+class WindowingReport:
+    """
+    Tracks how much prompt volume windowing removed and how often it had to fall back.
+    """
+
+    def __init__(self):
+        self.emails = 0
+        self.windowed = 0
+        self.chars_before = 0
+        self.chars_after = 0
+        self.fallbacks = 0
+
+    def add(self, original, windowed):
+        self.emails += 1
+        self.chars_before += len(original or "")
+        self.chars_after += len(windowed or "")
+        if windowed != original:
+            self.windowed += 1
+
+    def summary(self):
+        removed = self.chars_before - self.chars_after
+        return {
+            "emails": self.emails,
+            "windowed": self.windowed,
+            "chars_removed": removed,
+            "tokens_removed": removed // 4,
+            "percent_removed": round(100.0 * removed / self.chars_before, 1) if self.chars_before else 0.0,
+            "full_body_fallbacks": self.fallbacks,
+        }
+
+    def log(self):
+        logging.info("Body windowing: %s", self.summary())
@@ -0,0 +1,85 @@
+import csv
+import json
+import logging
+import os
+import time
+
+import resilience
+
+# Message IDs still waiting for their category, kept across runs until written
+WRITEBACK_FILE = "writeback_queue.json"
+# Failed messages are listed here after each write-back phase
+FAILURES_FILE = "writeback_failures.csv"
+WRITE_RETRIES = 2
+
+
+class WritebackQueue:
+    """
+    Collects the messages whose extraction was saved and tags them all in
+    one phase at the end of the run, after the calendar is written. The
+    pending IDs are persisted first, so messages that could not be tagged
+    (or a run that died mid-phase) are picked up again by the next run.
+    """
+
+    def __init__(self, path=WRITEBACK_FILE):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.pending = json.load(file)
+        except FileNotFoundError:
+            self.pending = []
+        if self.pending:
+            logging.info("%d messages from an earlier run are still waiting for their category", len(self.pending))
+
+    def add(self, message_id):
+        if message_id not in self.pending:
+            self.pending.append(message_id)
+
+    def save(self):
+        if not self.pending:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.pending, file, indent=4)
+        os.replace(tmp_path, self.path)
+
+    def apply(self, source, messages_by_id=None, failures_path=FAILURES_FILE):
+        """
+        Writes the category to every pending message, skipping ones that
+        already have it. Returns a summary of tagged, skipped and failed
+        messages; failures stay queued and are written to failures_path.
+        """
+        self.save()
+        messages_by_id = messages_by_id or {}
+        tagged, skipped, failures = 0, 0, []
+        start = time.perf_counter()
+        for message_id in list(self.pending):
+            for attempt in range(WRITE_RETRIES + 1):
+                try:
+                    message = messages_by_id.get(message_id) or source.message_from_id(message_id)
+                    if source.mark_processed(message):
+                        tagged += 1
+                    else:
+                        skipped += 1
+                    self.pending.remove(message_id)
+                    break
+                except Exception as e:
+                    if attempt == WRITE_RETRIES:
+                        subject = getattr(messages_by_id.get(message_id), "subject", "")
+                        logging.error("Could not set the category on '%s': %s", subject or message_id, e)
+                        failures.append((message_id, subject, str(e)))
+                        break
+                    time.sleep(resilience.backoff_delay(attempt))
+        self.save()
+
+        with open(failures_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Message ID", "Subject", "Error"])
+            writer.writerows(failures)
+
+        summary = {"tagged": tagged, "already_tagged": skipped, "failed": len(failures),
+                   "seconds": round(time.perf_counter() - start, 2)}
+        logging.info("Category write-back: %s", summary)
+        return summary
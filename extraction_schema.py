@@ -0,0 +1,89 @@
+import json
+import re
+
+# orjson is much faster on large batches of responses; fall back to the standard library
+try:
+    import orjson
+
+    def _loads(text):
+        return orjson.loads(text)
+except ImportError:
+    def _loads(text):
+        return json.loads(text)
+
+# Fields every extraction record must contain, in the order the rest of the code expects them
+FIELDS = ["project_name", "contractor", "bid_due_date", "job_walk", "description"]
+
+# JSON schema sent to the model (and used to validate its replies)
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "project_name": {"type": ["string", "null"], "description": "Name of the project being bid"},
+        "contractor": {"type": ["string", "null"], "description": "General contractor requesting the bid"},
+        "bid_due_date": {"type": ["string", "null"], "description": "Bid due date and time as written in the email"},
+        "job_walk": {"type": ["string", "null"], "description": "Job walk / pre-bid meeting date, time and location"},
+        "description": {"type": ["string", "null"], "description": "Brief project description, noting union or prevailing wage"},
+    },
+    "required": FIELDS,
+    "additionalProperties": False,
+}
+
+# Matches a ```json fenced block some replies still wrap the payload in
+CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", flags=re.DOTALL | re.IGNORECASE)
+
+# Values the model uses to mean "not in the email"
+EMPTY_VALUES = {"", "n/a", "na", "none", "null", "not specified", "not mentioned", "unknown"}
+
+
+class SchemaError(ValueError):
+    """
+    Raised when a reply is not a valid extraction record.
+    """
+
+
+# Function to check one decoded record against the schema and clean up its values
+def validate_record(record):
+    if not isinstance(record, dict):
+        raise SchemaError(f"expected a JSON object, got {type(record).__name__}")
+    missing = [field for field in FIELDS if field not in record]
+    if missing:
+        raise SchemaError(f"missing fields: {', '.join(missing)}")
+    cleaned = {}
+    for field in FIELDS:
+        value = record[field]
+        if value is None:
+            cleaned[field] = None
+        elif isinstance(value, (str, int, float)):
+            value = " ".join(str(value).replace("**", "").split())
+            cleaned[field] = None if value.lower() in EMPTY_VALUES else value
+        else:
+            raise SchemaError(f"field '{field}' must be a string or null, got {type(value).__name__}")
+    return cleaned
+
+# Function to decode a reply, tolerating a code fence around the JSON
+def loads(content):
+    text = content or ""
+    fenced = CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return _loads(text)
+    except ValueError as e:
+        raise SchemaError(f"invalid JSON: {e}")
+
+# Function to parse and validate a single-email reply into the field tuple
+def parse_record(content):
+    record = validate_record(loads(content))
+    return tuple(record[field] for field in FIELDS)
+
+# Function to check whether a reply parses as a valid single-email record
+def is_valid_record(content):
+    try:
+        parse_record(content)
+    except SchemaError:
+        return False
+    return True
+
+# Function to render the schema for prompts; braces are doubled so it can sit inside a str.format template
+def schema_text():
+    return json.dumps(EXTRACTION_SCHEMA, separators=(",", ":")).replace("{", "{{").replace("}", "}}")
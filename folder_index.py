@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+import time
+
+FOLDER_INDEX_FILE = "folder_index.json"
+# A full walk of every store is redone when the index is older than this, so new Bid folders show up within a day
+MAX_INDEX_AGE_DAYS = 1
+
+
+class FolderIndex:
+    """
+    Persisted list of the Bid folders found by the last full walk, as JSON:
+
+        {"refreshed": 1760000000.0,
+         "folders": {"Inbox\\Bid Invites": {"entry_id": "...", "store_id": "..."}}}
+
+    Folders are reopened from their EntryID and StoreID, so later runs don't
+    walk the folder tree at all. Refreshing is age-based: the whole index is
+    rebuilt by one full walk once it is older than max_age_days (Outlook
+    gives no cheap way to spot a new folder deep in a store).
+    """
+
+    def __init__(self, path=FOLDER_INDEX_FILE, max_age_days=MAX_INDEX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 86400
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            data = {}
+        self.refreshed = data.get("refreshed", 0.0)
+        self.folders = data.get("folders", {})
+
+    def stale(self):
+        return not self.folders or time.time() - self.refreshed > self.max_age
+
+    def paths(self):
+        return list(self.folders)
+
+    def get(self, folder_path):
+        return self.folders.get(folder_path)
+
+    def replace(self, folders):
+        """
+        Replaces every entry with the result of a full walk.
+        """
+        self.folders = dict(folders)
+        self.refreshed = time.time()
+        logging.info("Folder index refreshed: %d Bid folders", len(self.folders))
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"refreshed": self.refreshed, "folders": self.folders}, file, indent=4)
+        os.replace(tmp_path, self.path)
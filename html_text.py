@@ -0,0 +1,185 @@
+import argparse
+import logging
+import re
+import time
+from html.parser import HTMLParser
+
+# Elements whose content is never shown
+SKIPPED_TAGS = {"head", "style", "script", "title", "noscript", "template", "svg", "xml"}
+# Elements without an end tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# Elements that start a new line
+BLOCK_TAGS = {"address", "article", "blockquote", "center", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2", "h3",
+              "h4", "h5", "h6", "header", "li", "ol", "p", "pre", "section", "table", "ul"}
+# Inline styles used to hide preheaders and tracking blocks
+HIDDEN_STYLE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden|mso-hide\s*:\s*all|max-height\s*:\s*0(?:px)?\s*(?:;|$)|"
+                          r"font-size\s*:\s*0(?:px)?\s*(?:;|$)|opacity\s*:\s*0\s*(?:;|$)", flags=re.IGNORECASE)
+HIDDEN_CLASS = re.compile(r"\bpre-?header\b|\bpreview-?text\b", flags=re.IGNORECASE)
+WHITESPACE = re.compile(r"\s+")
+
+
+class HtmlToText(HTMLParser):
+    """
+    Single-pass HTML to text converter for email bodies. Table cells on one
+    row stay on one line separated by " | ", block elements start new lines,
+    and images (tracking pixels included), style/script blocks and hidden
+    elements such as preheaders are dropped.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        # Open elements, each with whether it hides its content
+        self.stack = []
+        self.hidden_depth = 0
+        # Open table rows, each as [index of its first chunk, cells seen so far]
+        self.rows = []
+
+    def newline(self):
+        # Ends the current line unless it is already empty, so nested blocks don't stack blank lines
+        for chunk in reversed(self.chunks):
+            if chunk.strip(" "):
+                if not chunk.endswith("\n"):
+                    self.chunks.append("\n")
+                return
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in ("br", "hr") and not self.hidden_depth:
+                self.chunks.append("\n")
+            return
+        attributes = dict(attrs)
+        hidden = (tag in SKIPPED_TAGS or "hidden" in attributes
+                  or HIDDEN_STYLE.search(attributes.get("style") or "") is not None
+                  or HIDDEN_CLASS.search(attributes.get("class") or "") is not None)
+        self.stack.append((tag, hidden))
+        self.hidden_depth += hidden
+        if not self.hidden_depth and (tag in BLOCK_TAGS or tag == "tr"):
+            self.newline()
+        if tag == "tr":
+            self.rows.append([len(self.chunks), 0])
+        elif tag in ("td", "th") and self.rows:
+            self.rows[-1][1] += 1
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        # Close anything left open inside the element, as browsers do
+        while self.stack:
+            open_tag, hidden = self.stack.pop()
+            self.hidden_depth -= hidden
+            if open_tag == "tr" and self.rows:
+                self.end_row()
+            if not self.hidden_depth:
+                if open_tag in ("td", "th"):
+                    self.chunks.append(" | ")
+                elif open_tag in BLOCK_TAGS or open_tag == "tr":
+                    self.newline()
+            if open_tag == tag:
+                break
+
+    def end_row(self):
+        # Cell text wrapped in <div>/<p>/<br> stays on the row's line. Single-cell
+        # rows are layout tables wrapping the whole email, so their lines are kept.
+        start, cells = self.rows.pop()
+        if cells >= 2:
+            for index in range(start, len(self.chunks)):
+                if self.chunks[index] == "\n":
+                    self.chunks[index] = " "
+
+    def handle_data(self, data):
+        if self.hidden_depth:
+            return
+        # Line breaks in the HTML source are just spacing; only tags (and <pre>) start new lines
+        if not any(open_tag == "pre" for open_tag, _ in self.stack):
+            data = WHITESPACE.sub(" ", data)
+        self.chunks.append(data)
+
+    def text(self):
+        lines = []
+        for line in "".join(self.chunks).split("\n"):
+            line = " ".join(line.split())
+            # Empty cells and layout-only tables leave stray separators behind
+            line = re.sub(r"(?:\|\s*){2,}", "| ", line).strip(" |")
+            if line or (lines and lines[-1]):
+                lines.append(line)
+        return "\n".join(lines).strip()
+
+
+# Function to convert an HTML body to text
+def html_to_text(html):
+    converter = HtmlToText()
+    converter.feed(html or "")
+    converter.close()
+    return converter.text()
+
+
+class HtmlConversionReport:
+    """
+    Tracks how long HTML conversion took and how much it shrank the bodies.
+    """
+
+    def __init__(self):
+        self.emails = 0
+        self.html_chars = 0
+        self.text_chars = 0
+        self.seconds = 0.0
+
+    def convert(self, html):
+        start = time.perf_counter()
+        text = html_to_text(html)
+        self.seconds += time.perf_counter() - start
+        self.emails += 1
+        self.html_chars += len(html)
+        self.text_chars += len(text)
+        return text
+
+    def summary(self):
+        return {
+            "emails": self.emails,
+            "html_chars": self.html_chars,
+            "text_chars": self.text_chars,
+            "convert_seconds": round(self.seconds, 3),
+            "ms_per_email": round(1000 * self.seconds / self.emails, 2) if self.emails else 0.0,
+        }
+
+    def log(self):
+        logging.info("HTML body conversion: %s", self.summary())
+
+
+# Function to compare reading Body against reading HTMLBody and converting it, on the same messages
+def compare_bodies(source, folder, count):
+    plain = list(source.recent_messages(folder, count))
+    start = time.perf_counter()
+    bodies = [message.body for message in plain]
+    body_seconds = time.perf_counter() - start
+
+    rich = list(source.recent_messages(folder, count))
+    start = time.perf_counter()
+    htmls = [message.html_body for message in rich]
+    html_seconds = time.perf_counter() - start
+    report = HtmlConversionReport()
+    texts = [report.convert(html) if html else body for html, body in zip(htmls, bodies)]
+
+    print(f"{'Path':<28}{'Seconds':>10}{'Chars':>12}{'Table rows':>12}")
+    print(f"{'Body':<28}{body_seconds:>10.2f}{sum(map(len, bodies)):>12}{sum(body.count(' | ') for body in bodies):>12}")
+    print(f"{'HTMLBody read':<28}{html_seconds:>10.2f}{sum(len(html or '') for html in htmls):>12}{'':>12}")
+    print(f"{'HTMLBody read + convert':<28}{html_seconds + report.seconds:>10.2f}{sum(map(len, texts)):>12}"
+          f"{sum(text.count(' | ') for text in texts):>12}")
+    return report.summary()
+
+
+if __name__ == "__main__":
+    import mail_sources
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Compare message.Body against converted HTMLBody on recent emails.")
+    arg_parser.add_argument("--source", choices=["outlook", "eml", "mbox", "maildir", "imap"], default="outlook")
+    arg_parser.add_argument("--source-path")
+    arg_parser.add_argument("--folder", required=True, help="Folder path as listed by the extraction script.")
+    arg_parser.add_argument("--count", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    source = mail_sources.open_source(args.source, args.source_path)
+    print(compare_bodies(source, source.open_folder(args.folder), args.count))
+    source.close()
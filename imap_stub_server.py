@@ -0,0 +1,198 @@
+import argparse
+import email
+import imaplib
+import logging
+import os
+import re
+import socketserver
+import time
+from email import policy
+from email.utils import parsedate_to_datetime
+
+# Local stand-in IMAP server for testing the IMAP mail source without a hosted mailbox.
+# Serves a directory of exported .eml files read-only: .eml files in the root are INBOX
+# and every subdirectory is a folder. Start it and run the extraction script with
+#   --source imap --source-path imap://user@127.0.0.1:1143   (IMAP_PASSWORD=anything)
+#
+# Only what the IMAP source uses is implemented: LOGIN, LIST, SELECT/EXAMINE,
+# UID SEARCH (ALL, SINCE, UID) and UID FETCH (UID, INTERNALDATE, BODY.PEEK[...]).
+
+UIDVALIDITY = 1
+DELIMITER = "/"
+
+
+# Function to load every mailbox under the root as {name: [raw message bytes]}, in UID order
+def load_mailboxes(root):
+    mailboxes = {}
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        relative = os.path.relpath(directory, root)
+        name = "INBOX" if relative == "." else relative.replace(os.sep, DELIMITER)
+        messages = []
+        for file_name in sorted(files):
+            if file_name.lower().endswith(".eml"):
+                with open(os.path.join(directory, file_name), "rb") as file:
+                    messages.append(file.read())
+        mailboxes[name] = messages
+    return mailboxes
+
+# Function to get a message's arrival time from its Date header
+def internal_date(raw):
+    headers = email.message_from_bytes(raw, policy=policy.default)
+    try:
+        return parsedate_to_datetime(headers["Date"]).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return time.time()
+
+# Function to expand an IMAP sequence set ("1:5,9,12:*") against the UIDs that exist
+def expand_uids(sequence_set, uids):
+    largest = max(uids) if uids else 0
+    selected = set()
+    for part in sequence_set.split(","):
+        first, _, last = part.partition(":")
+        first = largest if first == "*" else int(first)
+        last = first if not last else largest if last == "*" else int(last)
+        low, high = min(first, last), max(first, last)
+        selected.update(uid for uid in uids if low <= uid <= high)
+    return sorted(selected)
+
+# Function to split a command line into words, keeping quoted strings and bracketed/parenthesized groups whole
+def split_arguments(text):
+    return [word.strip('"') for word in re.findall(r'"(?:[^"\\]|\\.)*"|\S+\[[^\]]*\](?:<[\d.]+>)?|\([^)]*\)|\S+', text)]
+
+
+class ImapStubHandler(socketserver.StreamRequestHandler):
+    # Filled in from the command line by run_server
+    config = None
+    mailboxes = None
+
+    def send(self, line):
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self):
+        self.selected = None
+        self.send("* OK IMAP4rev1 stub ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode("utf-8", "replace").rstrip("\r\n")
+            logging.debug("imap stub: %s", line)
+            tag, _, rest = line.partition(" ")
+            command, _, arguments = rest.partition(" ")
+            command = command.upper()
+            if command == "UID":
+                command, _, arguments = arguments.partition(" ")
+                command = "UID " + command.upper()
+            handler = getattr(self, "do_" + command.replace(" ", "_"), None)
+            if handler is None:
+                self.send(f"{tag} BAD Unsupported command {command}")
+                continue
+            time.sleep(self.config.latency)
+            if handler(tag, arguments) is False:
+                return
+
+    def do_CAPABILITY(self, tag, arguments):
+        self.send("* CAPABILITY IMAP4rev1")
+        self.send(f"{tag} OK CAPABILITY completed")
+
+    def do_NOOP(self, tag, arguments):
+        self.send(f"{tag} OK NOOP completed")
+
+    def do_LOGIN(self, tag, arguments):
+        user, password = split_arguments(arguments)[:2]
+        if self.config.password and password != self.config.password:
+            self.send(f"{tag} NO [AUTHENTICATIONFAILED] Invalid credentials")
+            return
+        self.send(f"{tag} OK LOGIN completed")
+
+    def do_LOGOUT(self, tag, arguments):
+        self.send("* BYE stub logging out")
+        self.send(f"{tag} OK LOGOUT completed")
+        return False
+
+    def do_LIST(self, tag, arguments):
+        for name in self.mailboxes:
+            self.send(f'* LIST (\\HasNoChildren) "{DELIMITER}" "{name}"')
+        self.send(f"{tag} OK LIST completed")
+
+    def do_SELECT(self, tag, arguments):
+        name = split_arguments(arguments)[0]
+        if name not in self.mailboxes:
+            self.send(f"{tag} NO Mailbox does not exist")
+            return
+        self.selected = name
+        self.send(f"* {len(self.mailboxes[name])} EXISTS")
+        self.send(f"* OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid")
+        self.send(f"{tag} OK [READ-ONLY] SELECT completed")
+
+    do_EXAMINE = do_SELECT
+
+    def do_UID_SEARCH(self, tag, arguments):
+        words = split_arguments(arguments)
+        messages = self.mailboxes.get(self.selected, [])
+        uids = list(range(1, len(messages) + 1))
+        if words and words[0].upper() == "SINCE":
+            since = time.mktime(time.strptime(words[1], "%d-%b-%Y"))
+            uids = [uid for uid in uids if internal_date(messages[uid - 1]) >= since]
+        elif words and words[0].upper() == "UID":
+            uids = expand_uids(words[1], uids)
+        self.send("* SEARCH" + "".join(f" {uid}" for uid in uids))
+        self.send(f"{tag} OK SEARCH completed")
+
+    def do_UID_FETCH(self, tag, arguments):
+        sequence_set, _, items = arguments.partition(" ")
+        messages = self.mailboxes.get(self.selected, [])
+        header_fields = re.search(r"BODY\.PEEK\[HEADER\.FIELDS \(([^)]*)\)\]", items, flags=re.IGNORECASE)
+        for uid in expand_uids(sequence_set, list(range(1, len(messages) + 1))):
+            raw = messages[uid - 1]
+            parts = [f"UID {uid}"]
+            if "INTERNALDATE" in items.upper():
+                parts.append(f"INTERNALDATE {imaplib.Time2Internaldate(internal_date(raw))}")
+            literal = None
+            if header_fields:
+                wanted = header_fields.group(1).upper().split()
+                header_block = raw.split(b"\r\n\r\n", 1)[0] if b"\r\n\r\n" in raw else raw.split(b"\n\n", 1)[0]
+                kept = [line for line in re.split(rb"\r?\n(?![ \t])", header_block)
+                        if line.split(b":", 1)[0].decode("ascii", "replace").upper() in wanted]
+                literal = b"\r\n".join(kept) + b"\r\n\r\n"
+                parts.append(f"BODY[HEADER.FIELDS ({header_fields.group(1)})]")
+            elif "BODY.PEEK[]" in items.upper():
+                literal = raw
+                parts.append("BODY[]")
+            if literal is None:
+                self.send(f"* {uid} FETCH ({' '.join(parts)})")
+            else:
+                self.wfile.write(f"* {uid} FETCH ({' '.join(parts)} {{{len(literal)}}}\r\n".encode("utf-8") + literal + b")\r\n")
+        self.send(f"{tag} OK FETCH completed")
+
+
+class ThreadingImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+# Function to start the stub IMAP server and serve until interrupted
+def run_server(config):
+    ImapStubHandler.config = config
+    ImapStubHandler.mailboxes = load_mailboxes(config.mail_dir)
+    server = ThreadingImapServer((config.host, config.port), ImapStubHandler)
+    logging.info("Stub IMAP server on imap://%s:%d serving %d folders from %s",
+                 config.host, config.port, len(ImapStubHandler.mailboxes), config.mail_dir)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Local stand-in IMAP server over a directory of .eml files.")
+    arg_parser.add_argument("mail_dir", help="Directory of .eml files; subdirectories become folders.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=1143)
+    arg_parser.add_argument("--password", help="Password LOGIN must use (any password is accepted if omitted).")
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="Delay before every response, in seconds, to mimic a remote server.")
+    run_server(arg_parser.parse_args())
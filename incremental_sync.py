@@ -0,0 +1,91 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+CHECKPOINT_FILE = "sync_checkpoints.json"
+
+
+class SyncCheckpoints:
+    """
+    Per-folder high-water marks for incremental runs, persisted as JSON:
+
+        {"outlook:Inbox\\Bid Invites": {"received": "2026-06-03T17:00:00", "ids": ["..."]}}
+
+    "received" is the newest ReceivedTime fully processed and "ids" the
+    messages already handled at exactly that time, since several messages
+    can share a timestamp and only some of them may have been done. IMAP
+    folders also store "uid" and "uidvalidity" of the last message handled.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                self.checkpoints = json.load(file)
+        except FileNotFoundError:
+            self.checkpoints = {}
+
+    def get(self, folder_key):
+        """
+        Returns (received time, set of IDs seen at that time), or None if the folder has never been synced.
+        """
+        entry = self.checkpoints.get(folder_key)
+        if entry is None:
+            return None
+        return datetime.fromisoformat(entry["received"]), set(entry["ids"])
+
+    def entry(self, folder_key):
+        """
+        Returns the raw checkpoint entry for MailSource.messages_after, or None.
+        """
+        return self.checkpoints.get(folder_key)
+
+    def is_new(self, folder_key, message):
+        entry = self.entry(folder_key)
+        if entry is None:
+            return True
+        # Messages copied into an IMAP folder get a new UID but keep their old date, so UIDs decide there
+        if getattr(message, "uid", None) is not None and entry.get("uidvalidity") == message.uidvalidity:
+            return message.uid > entry["uid"]
+        received, seen = self.get(folder_key)
+        return message.received_time > received or (message.received_time == received and message.id not in seen)
+
+    def advance(self, folder_key, messages, done_ids):
+        """
+        Moves the checkpoint forward over the messages in done_ids, oldest
+        first, stopping at the first one that isn't done so it is fetched
+        again next run.
+        """
+        checkpoint = self.get(folder_key)
+        received, seen = checkpoint if checkpoint else (None, set())
+        for message in sorted(messages, key=lambda message: message.received_time):
+            if message.id not in done_ids:
+                logging.info("Sync checkpoint for %s held back at '%s'", folder_key, message.subject)
+                break
+            if message.received_time != received:
+                received, seen = message.received_time, set()
+            seen.add(message.id)
+        if received is None:
+            return
+        entry = {"received": received.isoformat(), "ids": sorted(seen)}
+
+        # IMAP folders also resume from a UID: the highest one below the first UID not done
+        previous = self.checkpoints.get(folder_key, {})
+        imap_messages = [message for message in messages if getattr(message, "uid", None) is not None]
+        if imap_messages:
+            uidvalidity = imap_messages[0].uidvalidity
+            pending = [message.uid for message in imap_messages if message.id not in done_ids]
+            uid = min(pending) - 1 if pending else max(message.uid for message in imap_messages)
+            if previous.get("uidvalidity") == uidvalidity:
+                uid = max(uid, previous["uid"])
+            entry.update(uid=uid, uidvalidity=uidvalidity)
+        elif "uid" in previous:
+            entry.update(uid=previous["uid"], uidvalidity=previous["uidvalidity"])
+        self.checkpoints[folder_key] = entry
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.checkpoints, file, indent=4)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,838 @@
+import argparse
+import email
+import imaplib
+import logging
+import mailbox
+import os
+import queue
+import re
+import ssl
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email import policy
+from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+from urllib.parse import unquote, urlparse
+
+import folder_index
+import html_text
+
+# Category given to messages once their extraction has been saved
+PROCESSED_CATEGORY = "Orange Category"
+# Folders are offered for selection when their name contains this keyword
+FOLDER_KEYWORD = "Bid"
+
+# Outlook Table columns read in bulk, in the order _record unpacks them
+TABLE_COLUMNS = ("EntryID", "Subject", "SenderEmailAddress", "ReceivedTime")
+# Rows fetched per Table.GetArray call
+TABLE_BATCH_ROWS = 500
+# OlTableContents.olUserItems
+OL_USER_ITEMS = 0
+# OlBodyFormat.olFormatHTML
+OL_FORMAT_HTML = 2
+
+# IMAP connections kept open per source, and so the number of parallel body fetches
+IMAP_POOL_SIZE = 4
+# UIDs per bulk header FETCH, and per parallel body FETCH
+IMAP_HEADER_BATCH = 500
+IMAP_BODY_BATCH = 20
+IMAP_HEADER_FIELDS = "SUBJECT FROM DATE MESSAGE-ID"
+# IMAP password, when not set in the IMAP_PASSWORD environment variable
+IMAP_PASSWORD_FILE = "imap_password.txt"
+
+
+class Attachment:
+    """
+    One attachment of a message; the content is only read when read() is called.
+    """
+
+    def __init__(self, filename, content_type, size, loader):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self._loader = loader
+
+    def read(self):
+        return self._loader()
+
+
+class MailMessage:
+    """
+    Source-independent message record. body and attachments are loaded on
+    first use, so selecting and filtering messages only touches headers.
+    """
+
+    def __init__(self, id, subject, received_time, sender, body_loader, attachments_loader=None, handle_loader=None, html_loader=None):
+        self.id = id
+        self.subject = subject or ""
+        self.received_time = received_time
+        self.sender = sender or ""
+        self._handle_loader = handle_loader
+        self._body_loader = body_loader
+        self._html_loader = html_loader
+        self._attachments_loader = attachments_loader
+        self._body = None
+        self._html_body = False
+        self._attachments = None
+
+    @property
+    def body(self):
+        if self._body is None:
+            self._body = self._body_loader() or ""
+        return self._body
+
+    @property
+    def html_body(self):
+        """
+        The HTML version of the body, or None for plain-text messages.
+        """
+        if self._html_body is False:
+            self._html_body = self._html_loader() if self._html_loader else None
+        return self._html_body
+
+    @property
+    def attachments(self):
+        if self._attachments is None:
+            self._attachments = self._attachments_loader() if self._attachments_loader else []
+        return self._attachments
+
+    @property
+    def handle(self):
+        """
+        The backend's own object for the message (the Outlook MailItem), if it has one.
+        """
+        return self._handle_loader() if self._handle_loader else None
+
+
+class MailSource:
+    """
+    Interface every mail backend implements.
+    """
+
+    name = "mail"
+
+    def find_bid_folders(self, refresh=False):
+        """
+        Returns the paths of the folders whose name contains FOLDER_KEYWORD.
+        """
+        return [path for path, _ in self._list_folders()]
+
+    def open_folder(self, path):
+        """
+        Returns the folder at a path given by find_bid_folders, for recent_messages and messages_since.
+        """
+        folders = dict(self._list_folders())
+        if path not in folders:
+            raise ValueError(f"No folder named '{path}' in the {self.name} source")
+        return folders[path]
+
+    def _list_folders(self):
+        """
+        Returns (path, folder) pairs for the file backends.
+        """
+        raise NotImplementedError
+
+    def recent_messages(self, folder, count, start=0):
+        """
+        Yields up to `count` MailMessage records from the folder, newest
+        first, skipping the `start` most recent ones.
+        """
+        raise NotImplementedError
+
+    def messages_since(self, folder, since):
+        """
+        Yields the MailMessage records received at or after `since`, newest first.
+        """
+        raise NotImplementedError
+
+    def messages_after(self, folder, checkpoint):
+        """
+        Yields the messages at or after a sync checkpoint entry (see
+        incremental_sync); IDs already seen are dropped by the caller.
+        """
+        return self.messages_since(folder, datetime.fromisoformat(checkpoint["received"]))
+
+    def prefetch(self, messages):
+        """
+        Starts loading the bodies of selected messages ahead of use, where the backend can.
+        """
+        pass
+
+    def close(self):
+        pass
+
+    # Whether mark_processed stores anything; the file backends have nowhere to keep a category
+    supports_categories = False
+
+    def message_from_id(self, message_id):
+        """
+        Reopens a message by the ID of an earlier MailMessage, for write-back retries.
+        """
+        raise NotImplementedError
+
+    def mark_processed(self, message, category=PROCESSED_CATEGORY):
+        """
+        Gives the message the category. Returns False if it already had it.
+        """
+        return False
+
+
+# Function to make a datetime timezone-naive in local time so messages from every source compare
+def naive_local(value):
+    if value is None:
+        return datetime.min
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+# Function to read just the header block of an RFC 822 file, so the body stays on disk until needed
+def read_headers(file):
+    lines = []
+    for line in file:
+        if line in (b"\n", b"\r\n"):
+            break
+        lines.append(line)
+    return BytesParser(policy=policy.default).parsebytes(b"".join(lines), headersonly=True)
+
+# Function to get the received time of a parsed message from its Date header
+def header_date(headers):
+    try:
+        return naive_local(parsedate_to_datetime(headers["Date"]))
+    except (TypeError, ValueError, IndexError):
+        return datetime.min
+
+# Function to pull the readable text out of a parsed message
+def message_text(parsed):
+    part = parsed.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    if part.get_content_type() == "text/html":
+        return html_text.html_to_text(part.get_content())
+    return part.get_content()
+
+# Function to get the HTML part of a parsed message, if it has one
+def message_html(parsed):
+    part = parsed.get_body(preferencelist=("html",))
+    return part.get_content() if part is not None else None
+
+# Function to list a parsed message's attachments
+def message_attachments(parsed):
+    attachments = []
+    for part in parsed.iter_attachments():
+        payload = part.get_payload(decode=True) or b""
+        attachments.append(Attachment(part.get_filename() or "attachment", part.get_content_type(), len(payload),
+                                      lambda payload=payload: payload))
+    return attachments
+
+# Function to build a MailMessage whose body is parsed from load_bytes() on first use
+def file_message(id, headers, load_bytes):
+    parsed = {}
+
+    def load():
+        if "message" not in parsed:
+            parsed["message"] = email.message_from_bytes(load_bytes(), policy=policy.default)
+        return parsed["message"]
+
+    return MailMessage(
+        id=id,
+        subject=str(headers.get("Subject", "")),
+        received_time=header_date(headers),
+        sender=str(headers.get("From", "")),
+        body_loader=lambda: message_text(load()),
+        html_loader=lambda: message_html(load()),
+        attachments_loader=lambda: message_attachments(load())
+    )
+
+# Function to sort header records newest first and take the requested slice
+def newest_slice(records, count, start):
+    records.sort(key=lambda record: record.received_time, reverse=True)
+    return records[start:start + count]
+
+# Function to keep header records received at or after `since`, newest first
+def newest_since(records, since):
+    return sorted((record for record in records if record.received_time >= since),
+                  key=lambda record: record.received_time, reverse=True)
+
+
+class EmlDirectorySource(MailSource):
+    """
+    A directory tree of exported .eml files; every subdirectory is a folder.
+    """
+
+    name = "eml"
+
+    def __init__(self, root):
+        self.root = root
+
+    def _list_folders(self):
+        bid_folders = [(os.path.basename(os.path.abspath(self.root)), self.root)]
+        for directory, subdirectories, _ in os.walk(self.root):
+            for subdirectory in sorted(subdirectories):
+                path = os.path.join(directory, subdirectory)
+                if FOLDER_KEYWORD in subdirectory:
+                    bid_folders.append((os.path.relpath(path, self.root).replace(os.sep, "\\"), path))
+        return bid_folders
+
+    def _records(self, folder):
+        records = []
+        for name in os.listdir(folder):
+            if not name.lower().endswith(".eml"):
+                continue
+            path = os.path.join(folder, name)
+            with open(path, "rb") as file:
+                headers = read_headers(file)
+
+            def load_bytes(path=path):
+                with open(path, "rb") as file:
+                    return file.read()
+
+            records.append(file_message(str(headers.get("Message-ID") or path), headers, load_bytes))
+        return records
+
+    def recent_messages(self, folder, count, start=0):
+        return iter(newest_slice(self._records(folder), count, start))
+
+    def messages_since(self, folder, since):
+        return iter(newest_since(self._records(folder), since))
+
+
+class MboxSource(MailSource):
+    """
+    One mbox file, or a directory of them where each file is a folder.
+    """
+
+    name = "mbox"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _list_folders(self):
+        if os.path.isfile(self.path):
+            return [(os.path.basename(self.path), self.path)]
+        return [(name, os.path.join(self.path, name)) for name in sorted(os.listdir(self.path))
+                if FOLDER_KEYWORD in name and os.path.isfile(os.path.join(self.path, name))]
+
+    def _records(self, folder):
+        box = mailbox.mbox(folder, create=False)
+        records = []
+        for key in box.iterkeys():
+            with box.get_file(key) as file:
+                headers = read_headers(file)
+            records.append(file_message(str(headers.get("Message-ID") or f"{folder}#{key}"), headers,
+                                        lambda key=key: box.get_bytes(key)))
+        return records
+
+    def recent_messages(self, folder, count, start=0):
+        return iter(newest_slice(self._records(folder), count, start))
+
+    def messages_since(self, folder, since):
+        return iter(newest_since(self._records(folder), since))
+
+
+class MaildirSource(MailSource):
+    """
+    A Maildir; the top level and each of its subfolders are folders.
+    """
+
+    name = "maildir"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _list_folders(self):
+        root = mailbox.Maildir(self.path, factory=None, create=False)
+        bid_folders = [(os.path.basename(os.path.abspath(self.path)), root)]
+
+        def walk(box, folder_path):
+            for name in box.list_folders():
+                child = box.get_folder(name)
+                child_path = f"{folder_path}\\{name}" if folder_path else name
+                if FOLDER_KEYWORD in name:
+                    bid_folders.append((child_path, child))
+                walk(child, child_path)
+
+        walk(root, "")
+        return bid_folders
+
+    def _records(self, folder):
+        records = []
+        for key in folder.iterkeys():
+            with folder.get_file(key) as file:
+                headers = read_headers(file)
+            records.append(file_message(key, headers, lambda key=key: folder.get_bytes(key)))
+        return records
+
+    def recent_messages(self, folder, count, start=0):
+        return iter(newest_slice(self._records(folder), count, start))
+
+    def messages_since(self, folder, since):
+        return iter(newest_since(self._records(folder), since))
+
+
+# Function to open an Outlook Table over a folder with just the metadata columns, newest first
+def folder_table(folder, restriction=""):
+    # Columns are fetched for many rows per call; Body can't be a Table column and is loaded per item later
+    table = folder.GetTable(restriction, OL_USER_ITEMS)
+    table.Columns.RemoveAll()
+    for column in TABLE_COLUMNS:
+        table.Columns.Add(column)
+    table.Sort("[ReceivedTime]", True)
+    return table
+
+# Function to read Table rows in GetArray batches, skipping the first `skip` and stopping after `limit`
+def table_rows(table, skip=0, limit=None):
+    while skip > 0 and not table.EndOfTable:
+        skip -= len(table.GetArray(min(skip, TABLE_BATCH_ROWS)))
+    while not table.EndOfTable and (limit is None or limit > 0):
+        rows = table.GetArray(TABLE_BATCH_ROWS if limit is None else min(limit, TABLE_BATCH_ROWS))
+        if not rows:
+            break
+        if limit is not None:
+            limit -= len(rows)
+        yield from rows
+
+
+class OutlookSource(MailSource):
+    """
+    The Outlook desktop client over COM (Windows only).
+    """
+
+    name = "outlook"
+    supports_categories = True
+
+    def __init__(self, index_path=folder_index.FOLDER_INDEX_FILE):
+        import win32com.client
+
+        # Connect to Outlook and get the namespace
+        logging.info("Connecting to Outlook...")
+        self.outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
+        self.folder_index = folder_index.FolderIndex(index_path)
+
+    # Function to recursively find folders containing the keyword "Bid"
+    def _find_bid_folders(self, folder, folder_path=""):
+        bid_folders = []
+        folder_path = f"{folder_path}\\{folder.Name}" if folder_path else folder.Name
+
+        # Check if the current folder's name contains "Bid"
+        if FOLDER_KEYWORD in folder.Name:
+            bid_folders.append((folder_path, folder))
+
+        # Recursively search subfolders
+        for subfolder in folder.Folders:
+            bid_folders.extend(self._find_bid_folders(subfolder, folder_path))
+
+        return bid_folders
+
+    def _folder_entry(self, folder):
+        return {"entry_id": folder.EntryID, "store_id": folder.StoreID}
+
+    def refresh_folders(self):
+        """
+        Walks every store once and rewrites the folder index.
+        """
+        logging.info("Indexing Outlook folders...")
+        bid_folders = []
+        for folder in self.outlook.Folders:
+            bid_folders.extend(self._find_bid_folders(folder))
+        self.folder_index.replace((path, self._folder_entry(folder)) for path, folder in bid_folders)
+        self.folder_index.save()
+
+    def find_bid_folders(self, refresh=False):
+        if refresh or self.folder_index.stale():
+            self.refresh_folders()
+        return self.folder_index.paths()
+
+    def open_folder(self, path):
+        # Resolve straight from the index; a missing or moved folder triggers one full walk
+        entry = self.folder_index.get(path)
+        folder = None
+        if entry is not None:
+            try:
+                folder = self.outlook.GetFolderFromID(entry["entry_id"], entry["store_id"])
+            except Exception as e:
+                logging.info("Indexed folder '%s' could not be opened (%s), re-indexing", path, e)
+        if folder is None:
+            self.refresh_folders()
+            entry = self.folder_index.get(path)
+            if entry is None:
+                raise ValueError(f"No folder named '{path}' in Outlook")
+            folder = self.outlook.GetFolderFromID(entry["entry_id"], entry["store_id"])
+        return folder
+
+    def _record(self, row):
+        entry_id, subject, sender, received_time = row
+        loaded = {}
+
+        # The MailItem is only opened when its body, attachments or category are needed
+        def item():
+            if "item" not in loaded:
+                loaded["item"] = self.outlook.GetItemFromID(entry_id)
+            return loaded["item"]
+
+        return MailMessage(
+            id=entry_id,
+            subject=subject,
+            # Table returns built-in date columns in local time, but pywin32 labels them UTC, so drop the zone
+            received_time=received_time.replace(tzinfo=None),
+            sender=sender,
+            body_loader=lambda: item().Body,
+            html_loader=lambda: item().HTMLBody if item().BodyFormat == OL_FORMAT_HTML else None,
+            attachments_loader=lambda: self._attachments(item()),
+            handle_loader=item
+        )
+
+    def _attachments(self, item):
+        attachments = []
+        for index in range(1, item.Attachments.Count + 1):
+            attachment = item.Attachments.Item(index)
+
+            # COM attachments can only be read by saving them to disk first
+            def load(attachment=attachment):
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, attachment.FileName)
+                    attachment.SaveAsFile(path)
+                    with open(path, "rb") as file:
+                        return file.read()
+
+            attachments.append(Attachment(attachment.FileName, "", attachment.Size, load))
+        return attachments
+
+    def recent_messages(self, folder, count, start=0):
+        # The store sorts the folder and hands back only the requested rows
+        table = folder_table(folder)
+        logging.info("Total emails in the selected folder: %d", table.GetRowCount())
+        for row in table_rows(table, skip=start, limit=count):
+            yield self._record(row)
+
+    def messages_since(self, folder, since):
+        # Restrict only compares to the minute, so the exact cut is made on our side
+        table = folder_table(folder, f"[ReceivedTime] >= '{since.strftime('%m/%d/%Y %I:%M %p')}'")
+        for row in table_rows(table):
+            record = self._record(row)
+            if record.received_time >= since:
+                yield record
+
+    def message_from_id(self, message_id):
+        item = self.outlook.GetItemFromID(message_id)
+        return MailMessage(
+            id=message_id,
+            subject=item.Subject,
+            received_time=item.ReceivedTime.replace(tzinfo=None),
+            sender=item.SenderEmailAddress,
+            body_loader=lambda: item.Body,
+            html_loader=lambda: item.HTMLBody if item.BodyFormat == OL_FORMAT_HTML else None,
+            attachments_loader=lambda: self._attachments(item),
+            handle_loader=lambda: item
+        )
+
+    def mark_processed(self, message, category=PROCESSED_CATEGORY):
+        # Other categories on the item are kept; Categories is a comma-separated list
+        item = message.handle
+        categories = [name.strip() for name in (item.Categories or "").split(",") if name.strip()]
+        if category in categories:
+            return False
+        original = item.Categories
+        item.Categories = ", ".join(categories + [category])
+        try:
+            item.Save()
+        except Exception:
+            # Leave the item as it was so a retry doesn't mistake it for already tagged
+            item.Categories = original
+            raise
+        return True
+
+
+# Function to compress sorted UIDs into an IMAP sequence set such as "1:5,9,12:14"
+def uid_ranges(uids):
+    ranges = []
+    for uid in sorted(uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(first) if first == last else f"{first}:{last}" for first, last in ranges)
+
+# Function to quote a mailbox name for an IMAP command
+def imap_quote(name):
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+# Function to split a UID FETCH response into {uid: (INTERNALDATE as local datetime, literal bytes)}
+def parse_fetch(data):
+    fetched = {}
+    for part in data:
+        if not isinstance(part, tuple):
+            continue
+        meta = part[0].decode("ascii", "replace")
+        uid = re.search(r"UID (\d+)", meta)
+        if not uid:
+            continue
+        received = None
+        internal_date = imaplib.Internaldate2tuple(part[0])
+        if internal_date:
+            received = datetime.fromtimestamp(time.mktime(internal_date))
+        fetched[int(uid.group(1))] = (received, part[1])
+    return fetched
+
+
+class ImapPool:
+    """
+    Up to `size` authenticated IMAP connections, reused between callers.
+    A connection that errors is dropped and replaced on next use.
+    """
+
+    def __init__(self, connect, size=IMAP_POOL_SIZE):
+        self.connect = connect
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                connection = self.connect()
+            try:
+                yield connection
+            except (imaplib.IMAP4.abort, OSError):
+                try:
+                    connection.shutdown()
+                except Exception:
+                    pass
+                raise
+            self.idle.put(connection)
+
+    def close(self):
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.logout()
+            except Exception:
+                pass
+
+
+class ImapSource(MailSource):
+    """
+    A hosted mailbox over IMAP, e.g. imaps://estimating@example.com@imap.example.com:993.
+    Headers are fetched in bulk by UID range; bodies are fetched on demand,
+    or in parallel batches after prefetch().
+    """
+
+    name = "imap"
+
+    def __init__(self, url, password, pool_size=IMAP_POOL_SIZE):
+        parsed = urlparse(url)
+        self.secure = parsed.scheme != "imap"
+        self.host = parsed.hostname
+        self.port = parsed.port or (993 if self.secure else 143)
+        self.user = unquote(parsed.username or "")
+        self.password = password
+        self.pool = ImapPool(self._connect, pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="imap-body")
+
+    def _connect(self):
+        if self.secure:
+            connection = imaplib.IMAP4_SSL(self.host, self.port, ssl_context=ssl.create_default_context())
+        else:
+            connection = imaplib.IMAP4(self.host, self.port)
+        connection.login(self.user, self.password)
+        connection.selected_mailbox = None
+        return connection
+
+    def _select(self, connection, mailbox_name):
+        if connection.selected_mailbox != mailbox_name:
+            status, data = connection.select(imap_quote(mailbox_name), readonly=True)
+            if status != "OK":
+                raise ValueError(f"Could not open IMAP folder '{mailbox_name}': {data}")
+            connection.selected_mailbox = mailbox_name
+            connection.uidvalidity = int(connection.response("UIDVALIDITY")[1][0])
+        return connection.uidvalidity
+
+    def _list_folders(self):
+        with self.pool.connection() as connection:
+            status, data = connection.list()
+        folders = []
+        for line in data or []:
+            match = re.match(rb'\((?P<flags>[^)]*)\) (?:"(?P<delimiter>[^"]*)"|NIL) (?P<name>.+)', line)
+            if not match or b"\\Noselect" in match.group("flags"):
+                continue
+            name = match.group("name").decode("utf-8", "replace").strip('"')
+            delimiter = (match.group("delimiter") or b"/").decode()
+            if FOLDER_KEYWORD in name.split(delimiter)[-1]:
+                folders.append((name.replace(delimiter, "\\"), name))
+        return folders
+
+    def _search(self, mailbox_name, *criteria):
+        with self.pool.connection() as connection:
+            uidvalidity = self._select(connection, mailbox_name)
+            status, data = connection.uid("SEARCH", *criteria)
+        return uidvalidity, sorted(int(uid) for uid in (data[0] or b"").split())
+
+    def _headers(self, mailbox_name, uidvalidity, uids):
+        """
+        Fetches header records for the UIDs, IMAP_HEADER_BATCH at a time.
+        """
+        records = []
+        for position in range(0, len(uids), IMAP_HEADER_BATCH):
+            batch = uids[position:position + IMAP_HEADER_BATCH]
+            with self.pool.connection() as connection:
+                self._select(connection, mailbox_name)
+                status, data = connection.uid("FETCH", uid_ranges(batch), f"(UID INTERNALDATE BODY.PEEK[HEADER.FIELDS ({IMAP_HEADER_FIELDS})])")
+            for uid, (received, header_bytes) in parse_fetch(data).items():
+                if uid not in batch:
+                    continue
+                records.append(self._record(mailbox_name, uidvalidity, uid, received, header_bytes))
+        records.sort(key=lambda record: record.uid, reverse=True)
+        return records
+
+    def _record(self, mailbox_name, uidvalidity, uid, received, header_bytes):
+        headers = BytesParser(policy=policy.default).parsebytes(header_bytes, headersonly=True)
+        loaded = {}
+
+        def load_bytes():
+            # Wait for a prefetch batch if one was started, otherwise fetch this message alone
+            if "future" in loaded:
+                return loaded["future"].result()[uid]
+            return self._bodies(mailbox_name, [uid])[uid]
+
+        record = file_message(f"{mailbox_name}/{uidvalidity}/{uid}", headers, load_bytes)
+        if received is not None:
+            record.received_time = received
+        record.uid = uid
+        record.uidvalidity = uidvalidity
+        record.mailbox = mailbox_name
+        record.prefetched = loaded
+        return record
+
+    def _bodies(self, mailbox_name, uids):
+        with self.pool.connection() as connection:
+            self._select(connection, mailbox_name)
+            status, data = connection.uid("FETCH", uid_ranges(uids), "(UID BODY.PEEK[])")
+        return {uid: body for uid, (_, body) in parse_fetch(data).items()}
+
+    def recent_messages(self, folder, count, start=0):
+        # UIDs grow with arrival, so the newest messages have the highest UIDs
+        uidvalidity, uids = self._search(folder, "ALL")
+        logging.info("Total emails in the selected folder: %d", len(uids))
+        selected = uids[max(0, len(uids) - start - count):max(0, len(uids) - start)]
+        return iter(self._headers(folder, uidvalidity, selected))
+
+    def messages_since(self, folder, since):
+        # SINCE only compares dates, so the exact cut is made on our side
+        uidvalidity, uids = self._search(folder, "SINCE", since.strftime("%d-%b-%Y"))
+        return iter([record for record in self._headers(folder, uidvalidity, uids) if record.received_time >= since])
+
+    def messages_after(self, folder, checkpoint):
+        with self.pool.connection() as connection:
+            uidvalidity = self._select(connection, folder)
+        if checkpoint.get("uidvalidity") != uidvalidity or "uid" not in checkpoint:
+            # UIDs were renumbered (or never recorded), so fall back to the received time
+            return super().messages_after(folder, checkpoint)
+        # "UID n:*" always matches the newest message, even when it is older than n
+        uidvalidity, uids = self._search(folder, "UID", f"{checkpoint['uid'] + 1}:*")
+        return iter(self._headers(folder, uidvalidity, [uid for uid in uids if uid > checkpoint["uid"]]))
+
+    def prefetch(self, messages):
+        by_mailbox = {}
+        for message in messages:
+            if "future" not in message.prefetched:
+                by_mailbox.setdefault(message.mailbox, []).append(message)
+        for mailbox_name, mailbox_messages in by_mailbox.items():
+            for position in range(0, len(mailbox_messages), IMAP_BODY_BATCH):
+                batch = mailbox_messages[position:position + IMAP_BODY_BATCH]
+                future = self.executor.submit(self._bodies, mailbox_name, [message.uid for message in batch])
+                for message in batch:
+                    message.prefetched["future"] = future
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+
+
+# Function to read the IMAP password from the environment or a config file
+def imap_password():
+    password = os.environ.get("IMAP_PASSWORD")
+    if password is not None:
+        return password
+    with open(IMAP_PASSWORD_FILE, "r") as file:
+        return file.read().strip()
+
+
+# Function to open the mail source named on the command line
+def open_source(kind, path=None):
+    if kind == "outlook":
+        return OutlookSource()
+    if not path:
+        raise ValueError(f"--source {kind} needs --source-path")
+    if kind == "eml":
+        return EmlDirectorySource(path)
+    if kind == "mbox":
+        return MboxSource(path)
+    if kind == "maildir":
+        return MaildirSource(path)
+    if kind == "imap":
+        return ImapSource(path, imap_password())
+    raise ValueError(f"Unknown mail source '{kind}'")
+
+
+# Function to time Python-side selection against Items.Sort/Restrict on one Outlook folder
+def compare_selection(folder, count, days):
+    """
+    Both approaches read the same fields (EntryID, Subject, ReceivedTime) from
+    the messages they select, so the difference is how many items cross COM.
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    timings = {}
+
+    start = time.perf_counter()
+    newest = sorted(folder.Items, key=lambda item: item.ReceivedTime, reverse=True)[:count]
+    python_recent = [(item.EntryID, item.Subject) for item in newest]
+    timings["recent N, sorted() in Python"] = (time.perf_counter() - start, len(python_recent))
+
+    start = time.perf_counter()
+    items = folder.Items
+    items.Sort("[ReceivedTime]", True)
+    store_recent = [(items.Item(index).EntryID, items.Item(index).Subject) for index in range(1, min(count, items.Count) + 1)]
+    timings["recent N, Items.Sort"] = (time.perf_counter() - start, len(store_recent))
+
+    start = time.perf_counter()
+    table_recent = [(row[0], row[1]) for row in table_rows(folder_table(folder), limit=count)]
+    timings["recent N, GetTable"] = (time.perf_counter() - start, len(table_recent))
+
+    start = time.perf_counter()
+    python_window = [(item.EntryID, item.Subject) for item in folder.Items if item.ReceivedTime.replace(tzinfo=None) >= cutoff]
+    timings["last N days, list comprehension"] = (time.perf_counter() - start, len(python_window))
+
+    start = time.perf_counter()
+    restricted = folder.Items.Restrict(f"[ReceivedTime] >= '{cutoff.strftime('%m/%d/%Y %I:%M %p')}'")
+    store_window = [(item.EntryID, item.Subject) for item in restricted]
+    timings["last N days, Items.Restrict"] = (time.perf_counter() - start, len(store_window))
+
+    print(f"Folder has {folder.Items.Count} items")
+    print(f"{'Selection':<36}{'Seconds':>10}{'Emails':>8}")
+    for name, (seconds, selected) in timings.items():
+        print(f"{name:<36}{seconds:>10.2f}{selected:>8}")
+    return timings
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Time Python-side email selection against Outlook's Items.Sort/Restrict.")
+    arg_parser.add_argument("--folder", type=int, help="Number of the Bid folder to time, as listed (asks if omitted).")
+    arg_parser.add_argument("--count", type=int, default=50, help="Number of most recent emails to select.")
+    arg_parser.add_argument("--days", type=int, default=7, help="Date window to select, in days.")
+    args = arg_parser.parse_args()
+
+    source = OutlookSource()
+    bid_folders = source.find_bid_folders()
+    for i, path in enumerate(bid_folders):
+        print(f"{i+1}. {path}")
+    selection = args.folder or int(input("Please enter the number of the folder you want to time: "))
+    compare_selection(source.open_folder(bid_folders[selection - 1]), args.count, args.days)
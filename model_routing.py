@@ -0,0 +1,135 @@
+import csv
+import logging
+import re
+
+from dateutil import parser
+
+import body_windowing
+import run_metrics
+
+# The two models we route between (see "OpenAiApiAutomation copy 2.py" for the gpt-4o-mini fork)
+CHEAP_MODEL = "gpt-4o-mini"
+LARGE_MODEL = "gpt-4o"
+
+# Emails up to this many body tokens can go to the cheap model
+SHORT_EMAIL_TOKENS = 800
+# Emails from bid platforms follow a fixed template, so they can be a little longer
+PLATFORM_EMAIL_TOKENS = 1600
+# More distinct dates than this usually means several deadlines or projects in one email
+MAX_DISTINCT_DATES = 3
+
+# Bid platforms whose invites are template-like
+PLATFORM_MARKERS = re.compile(
+    r"buildingconnected|planhub|smartbid|isqft|procore|pipelinesuite|constructconnect|bidmail|e-?builder|bluebook",
+    flags=re.IGNORECASE
+)
+DATE_PATTERN = re.compile(r"\b\d{1,2}/\d{1,2}/\d{2,4}\b|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2}\b", flags=re.IGNORECASE)
+
+# Labelled sample columns and the extraction field each one checks
+LABEL_FIELDS = {"Project Name": 0, "Contractor": 1, "Bid Due Date": 2}
+
+
+# Function to decide which model an email should start with
+def choose_model(subject, body):
+    """
+    Short, template-like emails go to the cheap model. Long emails, and
+    emails that look ambiguous (many dates, or none of the usual bid wording),
+    go straight to the large model.
+    """
+    text = f"{subject or ''}\n{body or ''}"
+    tokens = len(text) // 4
+    limit = PLATFORM_EMAIL_TOKENS if PLATFORM_MARKERS.search(text) else SHORT_EMAIL_TOKENS
+    if tokens > limit:
+        return LARGE_MODEL
+    if len(set(date.lower() for date in DATE_PATTERN.findall(text))) > MAX_DISTINCT_DATES:
+        return LARGE_MODEL
+    if not body_windowing.ANCHORS.search(text):
+        return LARGE_MODEL
+    return CHEAP_MODEL
+
+# Function to decide whether a cheap-model result must be redone by the large model
+def needs_escalation(fields):
+    return body_windowing.missing_required(fields)
+
+
+class RoutingStats:
+    """
+    Counts how many emails started on each model and how many were escalated.
+    """
+
+    def __init__(self):
+        self.routes = {CHEAP_MODEL: 0, LARGE_MODEL: 0}
+        self.escalations = 0
+
+    def summary(self):
+        return {"routes": dict(self.routes), "escalations": self.escalations}
+
+
+# Function to check one extracted value against its label
+def same_value(column, expected, actual):
+    expected, actual = (expected or "").strip(), (actual or "").strip()
+    if not expected:
+        return not actual
+    if not actual:
+        return False
+    if column == "Bid Due Date":
+        try:
+            return parser.parse(expected, fuzzy=True).date() == parser.parse(actual, fuzzy=True).date()
+        except (ValueError, OverflowError):
+            return False
+    words_expected = set(re.findall(r"[a-z0-9]+", expected.lower()))
+    words_actual = set(re.findall(r"[a-z0-9]+", actual.lower()))
+    return words_expected <= words_actual or words_actual <= words_expected
+
+# Function to read a labelled sample (columns: Subject, Body, Project Name, Contractor, Bid Due Date)
+def load_labelled_sample(path):
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+# Function to compare the cheap, large and routed paths on a labelled sample
+def run_benchmark(samples, extract):
+    """
+    extract(subject, body, model) returns (fields or None, latency, cost).
+    Every sample is sent once to each model; the routed path is worked out
+    from those two results, so it costs no extra calls.
+    """
+    routes = {"cheap": [], "large": [], "routed": []}
+    for sample in samples:
+        subject, body = sample["Subject"], sample["Body"]
+        cheap = extract(subject, body, CHEAP_MODEL)
+        large = extract(subject, body, LARGE_MODEL)
+        routes["cheap"].append((sample, cheap))
+        routes["large"].append((sample, large))
+        if choose_model(subject, body) == LARGE_MODEL:
+            routes["routed"].append((sample, large))
+        elif needs_escalation(cheap[0]):
+            routes["routed"].append((sample, (large[0], cheap[1] + large[1], cheap[2] + large[2])))
+        else:
+            routes["routed"].append((sample, cheap))
+
+    report = {}
+    for route, results in routes.items():
+        latencies = [latency for _, (_, latency, _) in results]
+        agreement = {}
+        for column, index in LABEL_FIELDS.items():
+            matches = sum(1 for sample, (fields, _, _) in results
+                          if fields is not None and same_value(column, sample.get(column), fields[index]))
+            agreement[column] = round(matches / len(results), 3) if results else 0.0
+        report[route] = {
+            "emails": len(results),
+            "failed": sum(1 for _, (fields, _, _) in results if fields is None),
+            "latency_p50": run_metrics.percentile(latencies, 0.50),
+            "latency_p95": run_metrics.percentile(latencies, 0.95),
+            "total_cost": round(sum(cost for _, (_, _, cost) in results), 4),
+            "agreement": agreement,
+        }
+    return report
+
+# Function to print a benchmark report as a table
+def print_benchmark(report):
+    columns = list(LABEL_FIELDS)
+    print(f"{'Route':<8}{'Emails':>7}{'Failed':>7}{'p50':>8}{'p95':>8}{'Cost':>10}" + "".join(f"{column:>15}" for column in columns))
+    for route, row in report.items():
+        print(f"{route:<8}{row['emails']:>7}{row['failed']:>7}{row['latency_p50']:>8.2f}{row['latency_p95']:>8.2f}{row['total_cost']:>10.4f}"
+              + "".join(f"{row['agreement'][column]:>15.1%}" for column in columns))
+    logging.info("Benchmark report: %s", report)
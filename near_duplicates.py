@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import re
+
+# Maximum number of differing SimHash bits for two bodies to count as copies
+MAX_BODY_DISTANCE = 6
+# Minimum word overlap between subjects, so one template reused for different projects isn't merged
+MIN_SUBJECT_OVERLAP = 0.5
+SHINGLE_SIZE = 3
+# The 64-bit fingerprint is split into bands; copies within MAX_BODY_DISTANCE share at least one band exactly
+BANDS = 8
+
+
+# Function to normalize a subject for comparison (drops reply/forward/reminder prefixes)
+def normalize_subject(subject):
+    subject = re.sub(r'^\s*((RE|FW|FWD|REMINDER|UPDATED?|BID INVITE)\s*:\s*)+', '', subject or "", flags=re.IGNORECASE)
+    return " ".join(re.findall(r"[a-z0-9]+", subject.lower()))
+
+# Function to normalize a body for fingerprinting (links and spacing differ between copies)
+def normalize_body(body):
+    body = re.sub(r"(https?://|www\.)\S+", " ", (body or "").lower())
+    return re.findall(r"[a-z0-9]+", body)
+
+# Function to compute a 64-bit SimHash over word shingles
+def simhash(words, shingle_size=SHINGLE_SIZE):
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    weights = [0] * 64
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+# Function to count the differing bits between two fingerprints
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+# Function to measure word overlap between two normalized subjects
+def subject_overlap(a, b):
+    words_a, words_b = set(a.split()), set(b.split())
+    if not words_a or not words_b:
+        return 1.0 if words_a == words_b else 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+# Function to group near-duplicate jobs
+def find_duplicate_groups(jobs, max_distance=MAX_BODY_DISTANCE, min_subject_overlap=MIN_SUBJECT_OVERLAP):
+    """
+    jobs is a list of (job_id, subject, body). Returns a list of groups, each
+    a list of jobs, with the job that has the longest body first so it is
+    the one sent for extraction.
+    """
+    fingerprints = [(normalize_subject(subject), simhash(normalize_body(body))) for _, subject, body in jobs]
+    parent = list(range(len(jobs)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    # Only compare jobs that share a band of their fingerprint
+    band_bits = 64 // BANDS
+    buckets = {}
+    for index, (_, fingerprint) in enumerate(fingerprints):
+        for band in range(BANDS):
+            key = (band, fingerprint >> (band * band_bits) & ((1 << band_bits) - 1))
+            buckets.setdefault(key, []).append(index)
+
+    for members in buckets.values():
+        for position, first in enumerate(members):
+            for second in members[position + 1:]:
+                if find(first) == find(second):
+                    continue
+                if hamming_distance(fingerprints[first][1], fingerprints[second][1]) > max_distance:
+                    continue
+                if subject_overlap(fingerprints[first][0], fingerprints[second][0]) < min_subject_overlap:
+                    continue
+                parent[find(second)] = find(first)
+
+    groups = {}
+    for index, job in enumerate(jobs):
+        groups.setdefault(find(index), []).append(job)
+    return [sorted(group, key=lambda job: len(job[2] or ""), reverse=True) for group in groups.values()]
+
+# Function to log the dedup ratio for a run and return it
+def report_dedup(groups):
+    emails = sum(len(group) for group in groups)
+    ratio = 1 - len(groups) / emails if emails else 0.0
+    logging.info("Near-duplicate suppression: %d emails in %d groups (dedup ratio %.1f%%)", emails, len(groups), ratio * 100)
+    for group in groups:
+        if len(group) > 1:
+            logging.info("Extracting once for %d copies of: %s", len(group), group[0][1])
+    return ratio
@@ -0,0 +1,127 @@
+import logging
+import re
+
+from dateutil import parser
+
+# Trained spaCy model producing PROJECT_NAME, CONTRACTOR and BID_DUE_DATE
+NER_MODEL_PATH = "old versions/trained_ner_model"
+# Minimum confidence for a local answer to be used without asking the LLM
+CONFIDENCE_THRESHOLD = 0.75
+
+# Date regex patterns for "Month DD, YYYY" and "MM/DD/YYYY"
+date_patterns = [
+    r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December) \d{1,2}, \d{4}\b",  # "Month DD, YYYY"
+    r"\b\d{1,2}/\d{1,2}/\d{4}\b"  # "MM/DD/YYYY"
+]
+
+# Confidence given to each way a field can be found
+CONFIDENCE = {
+    "ner_in_subject": 1.0,
+    "ner": 0.8,
+    "ner_date": 0.9,
+    "regex_date": 0.6,
+}
+
+
+# Function to extract dates using regex patterns
+def extract_dates_with_regex(email_body):
+    for pattern in date_patterns:
+        match = re.search(pattern, email_body)
+        if match:
+            return match.group()
+    return None  # No date found
+
+def validate_date(entity):
+    try:
+        parser.parse(entity, fuzzy=False)
+        return True  # If date is valid
+    except (ValueError, OverflowError):
+        return False  # If not a valid date
+
+
+class LocalExtractor:
+    """
+    Runs the trained NER model plus the regex date fallback and scores how
+    much each answer can be trusted. If spaCy or the model can't be loaded the
+    extractor is disabled and every email goes to the LLM.
+    """
+
+    def __init__(self, model_path=NER_MODEL_PATH):
+        self.nlp = None
+        try:
+            import spacy
+            self.nlp = spacy.load(model_path)
+            logging.info("Loaded NER model from %s", model_path)
+        except Exception as e:
+            logging.warning("Local NER model unavailable, sending every email to the LLM: %s", e)
+
+    @property
+    def available(self):
+        return self.nlp is not None
+
+    def extract(self, subject, body):
+        """
+        Returns (fields, confidence) where fields is the usual five-field tuple
+        (job walk and description are never filled locally) and confidence is
+        the lowest score among the required fields.
+        """
+        doc = self.nlp(body or "")
+        project_name, contractor, bid_due_date = None, None, None
+        scores = {"project_name": 0.0, "contractor": 0.0, "bid_due_date": 0.0}
+
+        for ent in doc.ents:
+            if ent.label_ == "PROJECT_NAME" and not project_name:
+                project_name = ent.text.strip()
+                in_subject = project_name.lower() in (subject or "").lower()
+                scores["project_name"] = CONFIDENCE["ner_in_subject"] if in_subject else CONFIDENCE["ner"]
+            elif ent.label_ == "CONTRACTOR" and not contractor:
+                contractor = ent.text.strip()
+                scores["contractor"] = CONFIDENCE["ner"]
+            elif ent.label_ == "BID_DUE_DATE" and not bid_due_date and validate_date(ent.text):
+                bid_due_date = ent.text.strip()
+                scores["bid_due_date"] = CONFIDENCE["ner_date"]
+
+        # Use regex as a fallback if the model doesn't extract the bid due date
+        if not bid_due_date:
+            bid_due_date = extract_dates_with_regex(body or "")
+            if bid_due_date:
+                scores["bid_due_date"] = CONFIDENCE["regex_date"]
+
+        # Try the subject line when the body has no project name
+        if not project_name and subject:
+            for ent in self.nlp(subject).ents:
+                if ent.label_ == "PROJECT_NAME":
+                    project_name = ent.text.strip()
+                    scores["project_name"] = CONFIDENCE["ner"]
+                    break
+
+        return (project_name, contractor, bid_due_date, None, None), min(scores.values())
+
+
+# Function to answer what the local tier can and return the jobs that still need the LLM
+def run_local_tier(jobs, extractor, threshold=CONFIDENCE_THRESHOLD):
+    """
+    jobs is a list of (job_id, subject, body). Returns (answered, escalated)
+    where answered maps job_id to the field tuple.
+    """
+    answered = {}
+    escalated = []
+    if not extractor.available:
+        return answered, list(jobs)
+
+    for job_id, subject, body in jobs:
+        try:
+            fields, confidence = extractor.extract(subject, body)
+        except Exception as e:
+            logging.warning("Local extraction failed for '%s': %s", subject, e)
+            escalated.append((job_id, subject, body))
+            continue
+        if confidence >= threshold:
+            logging.info("Answered locally (confidence %.2f): %s", confidence, subject)
+            answered[job_id] = fields
+        else:
+            logging.info("Escalating to the LLM (confidence %.2f): %s", confidence, subject)
+            escalated.append((job_id, subject, body))
+
+    logging.info("Local tier answered %d of %d emails", len(answered), len(jobs))
+    return answered, escalated
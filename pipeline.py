@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+
+# Items allowed to wait between two stages; a full queue makes the stage before it wait
+QUEUE_SIZE = 32
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of the pipeline. fn(item) returns the item handed to the next
+    stage, or None to drop it. Stages after the first run on `workers` threads.
+    """
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.items = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.lock = threading.Lock()
+
+    def process(self, item):
+        start = time.perf_counter()
+        try:
+            result = self.fn(item)
+        except Exception as e:
+            logging.error("Pipeline stage '%s' failed on an item: %s", self.name, e)
+            result = None
+            failed = 1
+        else:
+            failed = 0
+        with self.lock:
+            self.items += 1
+            self.failed += failed
+            self.dropped += result is None and not failed
+            self.busy += time.perf_counter() - start
+        return result
+
+    def summary(self, elapsed):
+        return {
+            "items": self.items,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "workers": self.workers,
+            # Items per second over the whole run, and what the stage could do if it never waited
+            "throughput": round(self.items / elapsed, 2) if elapsed else 0.0,
+            "capacity": round(self.items * self.workers / self.busy, 2) if self.busy else 0.0,
+            "utilization": round(self.busy / (elapsed * self.workers), 3) if elapsed else 0.0,
+        }
+
+
+# Function to run one stage's worker thread
+def _work(stage, inbox, emit):
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            # Let the stage's other workers see the end too
+            inbox.put(_DONE)
+            return
+        result = stage.process(item)
+        if result is not None:
+            emit(result)
+
+# Function to stream items through a chain of stages connected by bounded queues
+def run_pipeline(items, stages, queue_size=QUEUE_SIZE):
+    """
+    The first stage runs on the calling thread while it iterates `items`,
+    so objects that belong to that thread (Outlook COM objects) never leave
+    it. Every later stage runs on its own threads and overlaps with the
+    others, so total time tracks the slowest stage rather than the sum.
+
+    Returns (outputs of the last stage, {stage name: throughput summary}).
+    """
+    outputs = []
+    outputs_lock = threading.Lock()
+
+    def collect(result):
+        with outputs_lock:
+            outputs.append(result)
+
+    inboxes = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+    threads = []
+    for position, stage in enumerate(stages[1:]):
+        emit = inboxes[position + 1].put if position + 1 < len(inboxes) else collect
+        stage_threads = [threading.Thread(target=_work, args=(stage, inboxes[position], emit), daemon=True,
+                                          name=f"pipeline-{stage.name}-{number}") for number in range(stage.workers)]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    start = time.perf_counter()
+    first = stages[0]
+    emit = inboxes[0].put if inboxes else collect
+    for item in items:
+        result = first.process(item)
+        if result is not None:
+            emit(result)
+
+    # Close each stage once everything before it has drained
+    for position, stage_threads in enumerate(threads):
+        inboxes[position].put(_DONE)
+        for thread in stage_threads:
+            thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = {stage.name: stage.summary(elapsed) for stage in stages}
+    logging.info("Pipeline finished %d items in %.1fs", len(outputs), elapsed)
+    for name, summary in stats.items():
+        logging.info("  stage %-8s %s", name, summary)
+    return outputs, stats
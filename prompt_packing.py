@@ -0,0 +1,87 @@
+import json
+import logging
+
+import extraction_schema
+
+# Defaults for packing several short emails into one request
+PACK_TOKEN_BUDGET = 6000
+MAX_PACKED_EMAIL_TOKENS = 400
+MAX_EMAILS_PER_PACK = 10
+MAX_TOKENS_PER_PACKED_EMAIL = 200
+
+PACKED_PROMPT = "Extract the project name, contractor, bid due date, job walk information (if available), and a brief project description (highlight union or prevailing wage if mentioned) from each of the following {count} emails. Each email starts with a line '=== Email ID: <id> ==='.\n\n{emails}\n\nRespond with a JSON object of the form {{\"emails\": [...]}} holding exactly one record per email. Each record has an integer \"id\" matching its email plus the fields of this schema, using null for anything the email doesn't mention:\n" + extraction_schema.schema_text()
+
+
+# Function to group jobs into packs of short emails that fit the token budget
+def pack_jobs(jobs, estimate_tokens, token_budget=PACK_TOKEN_BUDGET, max_email_tokens=MAX_PACKED_EMAIL_TOKENS, max_emails=MAX_EMAILS_PER_PACK):
+    """
+    jobs is a list of (job_id, subject, body). Long emails always end up in a
+    group of their own; short ones are packed in order until the budget is hit.
+    """
+    groups = []
+    current, current_tokens = [], 0
+    for job in jobs:
+        tokens = estimate_tokens(job[1], job[2])
+        if tokens > max_email_tokens:
+            groups.append([job])
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_emails):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(job)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+# Function to build the user prompt for a pack; emails are numbered 1..n in the prompt
+def build_packed_prompt(group):
+    emails = "\n\n".join(
+        f"=== Email ID: {number} ===\nSubject: {subject}\nBody: {body}"
+        for number, (_, subject, body) in enumerate(group, start=1)
+    )
+    return PACKED_PROMPT.format(count=len(group), emails=emails)
+
+# Function to split a packed response into {job_id: record JSON}; returns None if it is malformed
+def split_packed_response(content, group):
+    try:
+        payload = extraction_schema.loads(content)
+        records = payload["emails"] if isinstance(payload, dict) else payload
+        if not isinstance(records, list):
+            raise extraction_schema.SchemaError("'emails' is not a list")
+        split = {}
+        for record in records:
+            number = record.get("id") if isinstance(record, dict) else None
+            if not isinstance(number, int) or not 1 <= number <= len(group) or number in split:
+                raise extraction_schema.SchemaError(f"unexpected or repeated email ID {number!r}")
+            split[number] = extraction_schema.validate_record(record)
+    except (KeyError, extraction_schema.SchemaError) as e:
+        logging.warning("Packed response is malformed: %s", e)
+        return None
+
+    if len(split) != len(group):
+        logging.warning("Packed response has %d records for %d emails", len(split), len(group))
+        return None
+    return {group[number - 1][0]: json.dumps(record) for number, record in split.items()}
+
+
+class PackingStats:
+    """
+    Counts emails and API requests so a run can report its packing factor.
+    """
+
+    def __init__(self):
+        self.emails = 0
+        self.requests = 0
+        self.fallbacks = 0
+
+    def packing_factor(self):
+        return round(self.emails / self.requests, 2) if self.requests else 0.0
+
+    def summary(self):
+        return {
+            "emails": self.emails,
+            "requests": self.requests,
+            "packing_factor": self.packing_factor(),
+            "fallbacks": self.fallbacks,
+        }
@@ -0,0 +1,113 @@
+import csv
+import logging
+import re
+import sys
+
+# Saved classifier and vectorizer (same layout as old versions/main10.py)
+CLASSIFIER_FILE = "relevance_classifier.pkl"
+VECTORIZER_FILE = "relevance_vectorizer.pkl"
+REPORT_FILE = "relevance_report.csv"
+# Emails scoring below this probability of being a bid invite are skipped
+RELEVANCE_THRESHOLD = 0.2
+# How much of the body is used for scoring
+BODY_CHARS = 1000
+
+
+# Function to clean subject lines by removing prefixes
+def clean_subject(subject):
+    cleaned_subject = re.sub(r'^\s*(RE:|FW:|FWD:|bid invite:)\s*', '', subject or "", flags=re.IGNORECASE)
+    return cleaned_subject.strip()
+
+# Function to build the text the classifier scores for one email
+def relevance_text(subject, body):
+    return f"{clean_subject(subject)}\n{(body or '')[:BODY_CHARS]}"
+
+# Function to train a model based on past emails
+def train_model(training_emails, labels):
+    import joblib
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=2, sublinear_tf=True)
+    X = vectorizer.fit_transform(training_emails)
+
+    classifier = LogisticRegression(class_weight="balanced", max_iter=1000)
+    classifier.fit(X, labels)
+
+    # Save the model and vectorizer for future use
+    joblib.dump(classifier, CLASSIFIER_FILE)
+    joblib.dump(vectorizer, VECTORIZER_FILE)
+    logging.info("Relevance model and vectorizer saved.")
+
+
+class RelevanceFilter:
+    """
+    Scores emails with the saved TF-IDF + LogisticRegression model. If no
+    model has been trained yet, or joblib/scikit-learn aren't installed, the
+    filter is disabled and keeps everything.
+    """
+
+    def __init__(self, threshold=RELEVANCE_THRESHOLD):
+        self.threshold = threshold
+        try:
+            import joblib
+        except ImportError:
+            logging.warning("joblib is not installed, relevance filter disabled; keeping every email")
+            self.classifier = None
+            return
+        try:
+            self.classifier = joblib.load(CLASSIFIER_FILE)
+            self.vectorizer = joblib.load(VECTORIZER_FILE)
+        except Exception as e:
+            logging.warning("Relevance model unavailable, keeping every email: %s", e)
+            self.classifier = None
+
+    def score(self, jobs):
+        """
+        Scores a batch of (job_id, subject, body) jobs in one vectorizer pass.
+        Returns {job_id: probability of being a bid invite}.
+        """
+        if not jobs:
+            return {}
+        X = self.vectorizer.transform([relevance_text(subject, body) for _, subject, body in jobs])
+        # Column of the positive ("is a bid") class
+        positive = list(self.classifier.classes_).index(1)
+        probabilities = self.classifier.predict_proba(X)[:, positive]
+        return {job[0]: float(probability) for job, probability in zip(jobs, probabilities)}
+
+    def write_report(self, skipped, scores, report_path=REPORT_FILE):
+        """
+        Lists the skipped jobs, highest score first, so recall can be audited.
+        """
+        with open(report_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["EntryID", "Subject", "Score", "Threshold"])
+            for job_id, subject, _ in sorted(skipped, key=lambda job: scores[job[0]], reverse=True):
+                writer.writerow([job_id, subject, round(scores[job_id], 3), self.threshold])
+
+    def filter(self, jobs, report_path=REPORT_FILE):
+        """
+        Returns the jobs that pass the threshold and writes every skipped
+        email, with its score, to the report so recall can be audited.
+        """
+        if self.classifier is None:
+            return list(jobs)
+        scores = self.score(jobs)
+        kept = [job for job in jobs if scores[job[0]] >= self.threshold]
+        skipped = [job for job in jobs if scores[job[0]] < self.threshold]
+        self.write_report(skipped, scores, report_path)
+
+        logging.info("Relevance filter kept %d of %d emails (threshold %.2f); skipped emails listed in %s",
+                     len(kept), len(jobs), self.threshold, report_path)
+        return kept
+
+
+# Train the relevance model from a CSV of labelled emails (columns: Subject, Body, Label with 1 = bid invite)
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 2:
+        print("Usage: python relevance_filter.py labelled_emails.csv")
+        sys.exit(1)
+    with open(sys.argv[1], "r", newline="", encoding="utf-8") as file:
+        rows = list(csv.DictReader(file))
+    train_model([relevance_text(row["Subject"], row.get("Body", "")) for row in rows], [int(row["Label"]) for row in rows])
@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+# Defaults for retrying transient API failures
+MAX_RETRIES = 4
+BASE_DELAY = 1.0
+MAX_DELAY = 30.0
+
+# Defaults for the circuit breaker
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+MAX_COOLDOWN = 900.0
+MAX_OPEN_CYCLES = 4
+# How often callers held back by a probe in flight check whether it has finished
+PROBE_POLL = 0.5
+
+# Where completed extractions are kept until their messages are written back
+RESULTS_FILE = "extraction_results.jsonl"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when the API has kept failing through every cooldown and the run should stop sending requests.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open, callers
+    wait out the cooldown (pausing the run) and then one caller is let
+    through as a probe while the rest keep waiting; each failed probe doubles
+    the cooldown. After max_open_cycles failed probes the breaker gives up
+    and raises CircuitOpenError.
+
+    Safe to share between extraction threads and async tasks: state changes
+    happen under a lock, and failures of requests that were already in
+    flight when the circuit opened don't count as failed probes.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN, max_cooldown=MAX_COOLDOWN, max_open_cycles=MAX_OPEN_CYCLES):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_open_cycles = max_open_cycles
+        self.failures = 0
+        self.open_cycles = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def _admit(self):
+        """
+        Returns (seconds to wait before asking again, whether the caller is the probe).
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return 0.0, False
+            if self.open_cycles > self.max_open_cycles:
+                raise CircuitOpenError(f"API still failing after {self.open_cycles - 1} cooldowns")
+            remaining = self.opened_at + self.cooldown - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            if self.probing:
+                return PROBE_POLL, False
+            self.probing = True
+            return 0.0, True
+
+    def before_call(self):
+        """
+        Blocks while the circuit is open. Returns True if the caller is the probe.
+        """
+        while True:
+            delay, probe = self._admit()
+            if delay <= 0:
+                return probe
+            if delay > PROBE_POLL:
+                logging.warning("Circuit open after repeated API failures, pausing for %.0fs", delay)
+            time.sleep(delay)
+
+    async def before_call_async(self):
+        while True:
+            delay, probe = self._admit()
+            if delay <= 0:
+                return probe
+            if delay > PROBE_POLL:
+                logging.warning("Circuit open after repeated API failures, pausing for %.0fs", delay)
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logging.info("API recovered, closing circuit")
+            self.failures = 0
+            self.open_cycles = 0
+            self.opened_at = None
+            self.probing = False
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self, probe=False):
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is not None:
+                if not probe:
+                    # A request sent before the circuit opened; the probe decides the next cycle
+                    return
+                # A failed probe re-opens the circuit with a longer cooldown
+                self.open_cycles += 1
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self.opened_at = time.monotonic()
+                self.probing = False
+            elif self.failures >= self.failure_threshold:
+                self.open_cycles = 1
+                self.opened_at = time.monotonic()
+
+    def release(self, probe):
+        """
+        Lets another caller probe when the probe ended without an API answer either way.
+        """
+        if probe:
+            with self.lock:
+                self.probing = False
+
+
+# Function to work out the jittered exponential backoff before retry number `attempt`
+def backoff_delay(attempt, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+# Function to call fn with bounded exponential-backoff retries on transient errors
+def retry_call(fn, *args, retry_on=(Exception,), breaker=None, retries=MAX_RETRIES, on_retry=None, **kwargs):
+    for attempt in range(retries + 1):
+        probe = breaker.before_call() if breaker else False
+        try:
+            result = fn(*args, **kwargs)
+        except retry_on as e:
+            if breaker:
+                breaker.record_failure(probe)
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning("Transient API error (%s), retry %d of %d in %.1fs", e, attempt + 1, retries, delay)
+            if on_retry:
+                on_retry()
+            time.sleep(delay)
+            continue
+        except BaseException:
+            if breaker:
+                breaker.release(probe)
+            raise
+        if breaker:
+            breaker.record_success()
+        return result
+
+# Async version of retry_call
+async def retry_call_async(fn, *args, retry_on=(Exception,), breaker=None, retries=MAX_RETRIES, on_retry=None, **kwargs):
+    for attempt in range(retries + 1):
+        probe = await breaker.before_call_async() if breaker else False
+        try:
+            result = await fn(*args, **kwargs)
+        except retry_on as e:
+            if breaker:
+                breaker.record_failure(probe)
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning("Transient API error (%s), retry %d of %d in %.1fs", e, attempt + 1, retries, delay)
+            if on_retry:
+                on_retry()
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            if breaker:
+                breaker.release(probe)
+            raise
+        if breaker:
+            breaker.record_success()
+        return result
+
+
+class ResultStore:
+    """
+    Append-only JSONL file of completed extractions keyed by message ID.
+    Results are written as soon as they arrive, so an interrupted run loses
+    nothing, and are dropped once their messages have been written back.
+    """
+
+    def __init__(self, path=RESULTS_FILE):
+        self.path = path
+        self.results = {}
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short if a run was killed mid-write
+                        continue
+                    self.results[entry["id"]] = tuple(entry["fields"])
+        except FileNotFoundError:
+            pass
+        if self.results:
+            logging.info("Loaded %d completed extractions from an earlier run", len(self.results))
+
+    def __contains__(self, job_id):
+        return job_id in self.results
+
+    def get(self, job_id):
+        return self.results.get(job_id)
+
+    def add(self, job_id, fields):
+        self.results[job_id] = tuple(fields)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"id": job_id, "fields": list(fields)}, ensure_ascii=False) + "\n")
+
+    def discard(self, job_ids):
+        """
+        Forgets results whose messages are done and rewrites the file with what is left.
+        """
+        for job_id in job_ids:
+            self.results.pop(job_id, None)
+        if not self.results:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for job_id, fields in self.results.items():
+                file.write(json.dumps({"id": job_id, "fields": list(fields)}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
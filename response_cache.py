@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+# Default location and limits for the on-disk response cache
+CACHE_DIR = "response_cache"
+MAX_ENTRIES = 20000
+MAX_BYTES = 200 * 1024 * 1024
+MAX_AGE_DAYS = 180
+
+# Function to normalize a subject line so "RE:"/"FW:" copies share a cache key
+def normalize_subject(subject):
+    subject = subject or ""
+    subject = re.sub(r'^\s*((RE|FW|FWD)\s*:\s*)+', '', subject, flags=re.IGNORECASE)
+    return " ".join(subject.split()).casefold()
+
+# Function to build a content-addressed key for one extraction request
+def make_cache_key(subject, body, model, prompt, max_tokens):
+    payload = json.dumps(
+        [normalize_subject(subject), body or "", model, prompt, max_tokens],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of raw LLM responses, one JSON file per key.
+    Entries older than max_age_days are dropped, and the oldest entries are
+    evicted first once the cache grows past max_entries or max_bytes.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                os.remove(path)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.get("content")
+
+    def put(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so an interrupted run never leaves a half-written entry
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({"created": time.time(), "content": content}, file)
+            os.replace(tmp_path, path)
+            self.writes += 1
+        except OSError as e:
+            logging.warning("Failed to write response cache entry %s: %s", key, e)
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json") or name == "stats.json":
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def prune(self):
+        """
+        Applies age- and size-based eviction. Returns the number of entries removed.
+        """
+        now = time.time()
+        entries = sorted(self._entries())
+        removed = 0
+        kept = []
+        for mtime, size, path in entries:
+            if now - mtime > self.max_age_seconds:
+                removed += self._remove(path)
+            else:
+                kept.append((mtime, size, path))
+
+        total_bytes = sum(size for _, size, _ in kept)
+        while kept and (len(kept) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = kept.pop(0)
+            total_bytes -= size
+            removed += self._remove(path)
+
+        self.evictions += removed
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            return 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def save_stats(self):
+        """
+        Adds this run's counters to the lifetime totals kept in stats.json.
+        """
+        stats_path = os.path.join(self.cache_dir, "stats.json")
+        try:
+            with open(stats_path, "r", encoding="utf-8") as file:
+                totals = json.load(file)
+        except (FileNotFoundError, ValueError):
+            totals = {}
+        for name in ("hits", "misses", "writes", "evictions"):
+            totals[name] = totals.get(name, 0) + getattr(self, name)
+        with open(stats_path, "w", encoding="utf-8") as file:
+            json.dump(totals, file, indent=4)
+        return totals
+
+
+# Print the cache size and lifetime hit/miss counts
+if __name__ == "__main__":
+    cache = ResponseCache()
+    entries = cache._entries()
+    print(f"Cache directory: {os.path.abspath(cache.cache_dir)}")
+    print(f"Entries: {len(entries)}")
+    print(f"Size: {sum(size for _, size, _ in entries) / 1024:.1f} KB")
+    try:
+        with open(os.path.join(cache.cache_dir, "stats.json"), "r", encoding="utf-8") as file:
+            totals = json.load(file)
+    except (FileNotFoundError, ValueError):
+        totals = {}
+    for name in ("hits", "misses", "writes", "evictions"):
+        print(f"Lifetime {name}: {totals.get(name, 0)}")
@@ -0,0 +1,138 @@
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+
+# Where per-run summaries and per-call records are written
+RUN_LOG_FILE = "run_log.jsonl"
+CALL_LOG_DIR = "run_calls"
+SLOWEST_EMAILS = 5
+
+# USD per 1M tokens (prompt, completion); update when pricing changes
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+
+# Function to work out the cost of one call in USD
+def call_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000000
+
+# Function to get a percentile from a list of numbers (nearest-rank)
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+# Function to read token usage from a chat completion response
+def response_usage(response):
+    usage = response.get("usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class RunMetrics:
+    """
+    Collects one record per extraction call (tokens, latency, model, retries)
+    and summarizes them at the end of the run.
+    """
+
+    def __init__(self, prompt_version=""):
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.prompt_version = prompt_version
+        self.started = time.monotonic()
+        self.calls = []
+        self.pending_retries = {}
+        self.repairs = 0
+        self.tiers = []
+
+    def count_retry(self, subject):
+        # Retries are attached to the next call recorded for the same subject
+        self.pending_retries[subject] = self.pending_retries.get(subject, 0) + 1
+
+    def count_repair(self):
+        # Responses that failed schema validation and needed a repair request
+        self.repairs += 1
+
+    def record_tier(self, subject, tier):
+        # Which extraction tier (e.g. local NER or LLM) answered an email
+        self.tiers.append({"subject": subject, "tier": tier})
+
+    def record(self, subject, model, latency, prompt_tokens=0, completion_tokens=0, retries=0, cached=False, emails=1):
+        retries += self.pending_retries.pop(subject, 0)
+        self.calls.append({
+            "subject": subject,
+            "model": model,
+            "latency": round(latency, 3),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "retries": retries,
+            "cached": cached,
+            "emails": emails,
+            "cost": round(call_cost(model, prompt_tokens, completion_tokens), 6),
+        })
+
+    def summary(self):
+        api_calls = [call for call in self.calls if not call["cached"]]
+        latencies = [call["latency"] for call in api_calls]
+        emails = sum(call["emails"] for call in self.calls)
+        total_tokens = sum(call["prompt_tokens"] + call["completion_tokens"] for call in api_calls)
+        slowest = sorted(api_calls, key=lambda call: call["latency"], reverse=True)[:SLOWEST_EMAILS]
+        return {
+            "run_id": self.run_id,
+            "prompt_version": self.prompt_version,
+            "models": sorted(set(call["model"] for call in api_calls)),
+            "wall_time": round(time.monotonic() - self.started, 1),
+            "emails": emails,
+            "api_calls": len(api_calls),
+            "cached_calls": len(self.calls) - len(api_calls),
+            "retries": sum(call["retries"] for call in self.calls),
+            "repairs": self.repairs,
+            "tiers": {tier: sum(1 for entry in self.tiers if entry["tier"] == tier) for tier in sorted(set(entry["tier"] for entry in self.tiers))},
+            "latency_p50": percentile(latencies, 0.50),
+            "latency_p95": percentile(latencies, 0.95),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in api_calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in api_calls),
+            "tokens_per_email": round(total_tokens / emails, 1) if emails else 0.0,
+            "total_cost": round(sum(call["cost"] for call in api_calls), 4),
+            "slowest_emails": [(call["subject"], call["latency"]) for call in slowest],
+        }
+
+    def save(self, run_log_path=RUN_LOG_FILE, call_log_dir=CALL_LOG_DIR):
+        """
+        Logs the summary, appends it to the run log and writes the per-call records.
+        """
+        summary = self.summary()
+        logging.info("Run summary: %d emails, %d API calls (%d cached, %d repairs), p50 %.2fs, p95 %.2fs, %.1f tokens/email, $%.4f",
+                     summary["emails"], summary["api_calls"], summary["cached_calls"], summary["repairs"], summary["latency_p50"],
+                     summary["latency_p95"], summary["tokens_per_email"], summary["total_cost"])
+        if summary["tiers"]:
+            logging.info("Answered by tier: %s", summary["tiers"])
+        for subject, latency in summary["slowest_emails"]:
+            logging.info("Slow email: %.2fs - %s", latency, subject)
+
+        with open(run_log_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        os.makedirs(call_log_dir, exist_ok=True)
+        with open(os.path.join(call_log_dir, f"{self.run_id}.jsonl"), "w", encoding="utf-8") as file:
+            for call in self.calls + self.tiers:
+                file.write(json.dumps(call, ensure_ascii=False) + "\n")
+        return summary
+
+
+# Print past runs from the run log to compare prompts and models
+if __name__ == "__main__":
+    try:
+        with open(RUN_LOG_FILE, "r", encoding="utf-8") as file:
+            runs = [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        runs = []
+    print(f"{'Run':<17}{'Prompt':<14}{'Models':<22}{'Emails':>7}{'Calls':>7}{'p50':>8}{'p95':>8}{'Tok/email':>11}{'Cost':>10}")
+    for run in runs:
+        print(f"{run['run_id']:<17}{run['prompt_version'][:12]:<14}{','.join(run['models'])[:20]:<22}{run['emails']:>7}"
+              f"{run['api_calls']:>7}{run['latency_p50']:>8.2f}{run['latency_p95']:>8.2f}{run['tokens_per_email']:>11.1f}{run['total_cost']:>10.4f}")
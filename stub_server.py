@@ -0,0 +1,155 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the chat completions endpoint, for load tests and offline regression runs.
+# Point the extraction script at it with --api-base http://127.0.0.1:8089/v1
+#
+# Modes:
+#   synthetic - answer every request with a generated, schema-valid reply
+#   record    - forward to the real API and save every reply as a fixture
+#   replay    - answer from saved fixtures only (deterministic, no network)
+
+UPSTREAM = "https://api.openai.com/v1"
+FIXTURES_DIR = "fixtures"
+
+
+# Function to key a request so the same prompt always maps to the same fixture
+def fixture_key(request_body):
+    # Only the parts that change the answer; stream flags and user IDs are ignored
+    relevant = {name: request_body.get(name) for name in ("model", "messages", "max_tokens", "temperature", "response_format")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Function to build a schema-valid reply from the prompt, for synthetic mode
+def synthetic_content(request_body):
+    prompt = request_body["messages"][-1]["content"]
+    subjects = re.findall(r"^Subject: (.*)$", prompt, flags=re.MULTILINE)
+    dates = re.findall(r"\b\d{1,2}/\d{1,2}/\d{2,4}\b", prompt)
+
+    def record(subject):
+        return {"project_name": subject.strip() or None, "contractor": None,
+                "bid_due_date": dates[0] if dates else None, "job_walk": None, "description": None}
+
+    # Packed prompts number each email and expect a list of records back
+    ids = re.findall(r"^=== Email ID: (\d+) ===$", prompt, flags=re.MULTILINE)
+    if ids:
+        return json.dumps({"emails": [dict(record(subject), id=int(number)) for number, subject in zip(ids, subjects)]})
+    return json.dumps(record(subjects[0] if subjects else ""))
+
+# Function to wrap reply text in a chat completion response
+def completion_response(request_body, content):
+    prompt_chars = sum(len(message.get("content") or "") for message in request_body.get("messages", []))
+    return {
+        "id": f"chatcmpl-stub-{random.getrandbits(48):012x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request_body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4,
+                  "total_tokens": prompt_chars // 4 + len(content) // 4},
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Filled in from the command line by run_server
+    config = None
+
+    def log_message(self, format, *args):
+        logging.debug("stub: " + format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+            return
+        request_body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.config
+
+        # Injected latency and failures
+        time.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+        roll = random.random()
+        if roll < config.rate_limit_rate:
+            self.send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "requests"}}, {"Retry-After": "1"})
+            return
+        if roll < config.rate_limit_rate + config.error_rate:
+            self.send_json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+            return
+
+        key = fixture_key(request_body)
+        fixture_path = os.path.join(config.fixtures, f"{key}.json")
+        if config.mode == "replay":
+            try:
+                with open(fixture_path, "r", encoding="utf-8") as file:
+                    self.send_json(200, json.load(file))
+            except FileNotFoundError:
+                self.send_json(404, {"error": {"message": f"No fixture recorded for request {key}", "type": "invalid_request_error"}})
+            return
+
+        if config.mode == "record":
+            upstream = urllib.request.Request(
+                f"{config.upstream}/chat/completions",
+                data=json.dumps(request_body).encode("utf-8"),
+                headers={"Content-Type": "application/json", "Authorization": self.headers.get("Authorization", "")},
+                method="POST"
+            )
+            try:
+                with urllib.request.urlopen(upstream, timeout=120) as response:
+                    payload = json.load(response)
+            except urllib.error.HTTPError as e:
+                # Pass upstream errors through without recording them
+                self.send_json(e.code, json.loads(e.read() or b"{}"))
+                return
+            os.makedirs(config.fixtures, exist_ok=True)
+            with open(fixture_path, "w", encoding="utf-8") as file:
+                json.dump(payload, file, indent=4)
+            self.send_json(200, payload)
+            return
+
+        self.send_json(200, completion_response(request_body, synthetic_content(request_body)))
+
+
+# Function to start the stub server and serve until interrupted
+def run_server(config):
+    StubHandler.config = config
+    random.seed(config.seed)
+    server = ThreadingHTTPServer((config.host, config.port), StubHandler)
+    logging.info("Stub chat completions server (%s mode) on http://%s:%d/v1", config.mode, config.host, config.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions API.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8089)
+    arg_parser.add_argument("--mode", choices=["synthetic", "record", "replay"], default="synthetic")
+    arg_parser.add_argument("--latency", type=float, default=2.0, help="Mean response latency in seconds.")
+    arg_parser.add_argument("--jitter", type=float, default=0.5, help="Standard deviation of the latency in seconds.")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500.")
+    arg_parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429.")
+    arg_parser.add_argument("--fixtures", default=FIXTURES_DIR, help="Directory for recorded responses.")
+    arg_parser.add_argument("--upstream", default=UPSTREAM, help="Real API base used in record mode.")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed so injected failures repeat between runs.")
+    run_server(arg_parser.parse_args())
@@ -0,0 +1,224 @@
+import logging
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import incremental_sync
+
+# Seconds between checks of every watched folder for mail past its checkpoint
+POLL_SECONDS = 60
+# A folder is run once it has been quiet this long, so a burst of invites becomes one run
+DEBOUNCE_SECONDS = 30
+# ...but never later than this after the first new message, even if mail keeps arriving
+MAX_WAIT_SECONDS = 300
+# A run that exits with an error is tried again after this long, even without new mail
+RETRY_SECONDS = 15 * 60
+# A run still going after this long is stopped; its emails are picked up by the next one
+RUN_TIMEOUT_SECONDS = 60 * 60
+# How often the watch loop wakes to deliver Outlook events and check timers
+TICK_SECONDS = 1
+
+# Options that only make sense for the watcher, and whether each takes a value
+WATCH_ONLY_OPTIONS = {"--watch": False, "--poll-seconds": True, "--debounce-seconds": True,
+                      "--folder": True, "--incremental": False, "--upsert": False, "--refresh-folders": False}
+
+
+# Function to build the command for one incremental run of the extraction script from the watcher's own arguments
+def run_command(argv, default_emails="1d"):
+    """
+    Watch-only options are dropped; every run is incremental, upserts the
+    calendar, and gets --folder added per run. --emails only matters for a
+    folder that has no checkpoint yet, so the first run doesn't prompt.
+    """
+    arguments = []
+    skip_value = False
+    for argument in argv[1:]:
+        if skip_value:
+            skip_value = False
+            continue
+        option, has_value, _ = argument.partition("=")
+        if option in WATCH_ONLY_OPTIONS:
+            skip_value = WATCH_ONLY_OPTIONS[option] and not has_value
+            continue
+        arguments.append(argument)
+    if not any(argument.partition("=")[0] == "--emails" for argument in arguments):
+        arguments += ["--emails", default_emails]
+    return [sys.executable, argv[0]] + arguments + ["--incremental", "--upsert"]
+
+
+class ItemAddEvents:
+    """
+    Outlook Items event sink. A subclass carrying `watcher` and `folder_path`
+    is made per folder, since the COM wrapper won't take new attributes.
+    """
+
+    def OnItemAdd(self, item):
+        self.watcher.notice(self.folder_path)
+
+
+class MailWatcher:
+    """
+    Keeps track of which watched folders have new mail and when each is due
+    for a run.
+
+    Outlook folders report new items through ItemAdd events. Every source is
+    also polled against its sync checkpoint, since Outlook drops ItemAdd
+    events when many items arrive at once and the file and IMAP sources have
+    no events at all. Between runs the watcher holds only the folder handles
+    and a few sets of IDs; each run does its work in its own process, so
+    whatever it loads is given back when that process exits.
+    """
+
+    def __init__(self, connect, folder_paths, poll_seconds=POLL_SECONDS, debounce_seconds=DEBOUNCE_SECONDS,
+                 max_wait_seconds=MAX_WAIT_SECONDS, checkpoint_path=incremental_sync.CHECKPOINT_FILE):
+        self.connect = connect
+        self.folder_paths = list(folder_paths)
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.checkpoint_path = checkpoint_path
+        self.started = datetime.now()
+        self.source = None
+        self.folders = {}
+        self.event_sinks = []
+        self.last_poll = 0.0
+        # Folder path -> (first notice, latest notice) for folders waiting to run
+        self.pending = {}
+        # Folder path -> IDs already accounted for (waiting for a run, or left behind by the last one),
+        # so polls only count mail they haven't seen and a burst can settle
+        self.known = {path: set() for path in self.folder_paths}
+        # Folder path -> time a failed run is tried again
+        self.retry_at = {}
+        self.runs = 0
+
+    def open(self):
+        self.source = self.connect()
+        self.folders = {path: self.source.open_folder(path) for path in self.folder_paths}
+        self.event_sinks = []
+        if self.source.name == "outlook":
+            import win32com.client
+
+            for path, folder in self.folders.items():
+                sink = type("FolderItemAddEvents", (ItemAddEvents,), {"watcher": self, "folder_path": path})
+                # The Items collection must stay referenced or Outlook stops sending its events
+                self.event_sinks.append(win32com.client.DispatchWithEvents(folder.Items, sink))
+        logging.info("Watching %d folders in the %s source (%s)", len(self.folders), self.source.name,
+                     "ItemAdd events and polling" if self.event_sinks else "polling")
+
+    def close(self):
+        self.event_sinks = []
+        self.folders = {}
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+    def pump(self):
+        # Outlook only delivers ItemAdd events while the thread's messages are pumped
+        if self.event_sinks:
+            import pythoncom
+
+            pythoncom.PumpWaitingMessages()
+
+    def notice(self, path, now=None):
+        now = time.monotonic() if now is None else now
+        first, _ = self.pending.get(path, (now, now))
+        self.pending[path] = (first, now)
+
+    def new_ids(self, path, checkpoints):
+        folder_key = f"{self.source.name}:{path}"
+        folder = self.folders[path]
+        entry = checkpoints.entry(folder_key)
+        if entry is None:
+            # Nothing processed yet in this folder; anything received since the watcher started is new
+            return {message.id for message in self.source.messages_since(folder, self.started)}
+        return {message.id for message in self.source.messages_after(folder, entry) if checkpoints.is_new(folder_key, message)}
+
+    def poll(self):
+        self.last_poll = time.monotonic()
+        try:
+            if self.source is None:
+                self.open()
+            # Runs move the checkpoints, so they are read fresh every poll
+            checkpoints = incremental_sync.SyncCheckpoints(self.checkpoint_path)
+            for path in self.folder_paths:
+                unseen = self.new_ids(path, checkpoints) - self.known[path]
+                if unseen:
+                    self.known[path] |= unseen
+                    self.notice(path)
+        except Exception as e:
+            # Outlook restarting or the IMAP server dropping the connection; reconnect on the next poll
+            logging.warning("Polling the watched folders failed, reconnecting next poll: %s", e)
+            self.close()
+        now = time.monotonic()
+        for path, retry_at in list(self.retry_at.items()):
+            if now >= retry_at:
+                del self.retry_at[path]
+                self.notice(path)
+
+    def due(self, now=None):
+        """
+        Returns the folders whose burst of new mail has settled, and takes them off the pending list.
+        """
+        now = time.monotonic() if now is None else now
+        ready = [path for path, (first, latest) in self.pending.items()
+                 if now - latest >= self.debounce_seconds or now - first >= self.max_wait_seconds]
+        for path in ready:
+            del self.pending[path]
+        return ready
+
+    def finished(self, path, succeeded):
+        """
+        Records a run of the folder; whatever it left behind (failed
+        extractions holding the checkpoint back) only runs again with new mail.
+        """
+        self.runs += 1
+        if not succeeded:
+            self.retry_at[path] = time.monotonic() + RETRY_SECONDS
+        try:
+            self.known[path] = self.new_ids(path, incremental_sync.SyncCheckpoints(self.checkpoint_path))
+        except Exception as e:
+            logging.warning("Could not re-read folder '%s' after its run: %s", path, e)
+            self.known[path] = set()
+
+
+# Function to run the extraction script once for one folder and report whether it succeeded
+def run_folder(command, folder_path, timeout=RUN_TIMEOUT_SECONDS):
+    logging.info("New mail in '%s', starting an incremental run", folder_path)
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(command + ["--folder", folder_path], timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logging.error("Run for '%s' was stopped after %d seconds", folder_path, timeout)
+        return False
+    if completed.returncode != 0:
+        logging.error("Run for '%s' exited with code %d after %.1fs", folder_path, completed.returncode, time.perf_counter() - start)
+        return False
+    logging.info("Run for '%s' finished in %.1fs", folder_path, time.perf_counter() - start)
+    return True
+
+# Function to watch the folders until interrupted, running each one as new mail settles
+def watch(connect, folder_paths, command, poll_seconds=POLL_SECONDS, debounce_seconds=DEBOUNCE_SECONDS, max_wait_seconds=MAX_WAIT_SECONDS):
+    """
+    Every folder is run once at start to catch up on mail that arrived while
+    nothing was watching. Runs are one at a time, so the calendar, the
+    checkpoints and the write-back queue only ever have one writer.
+    """
+    watcher = MailWatcher(connect, folder_paths, poll_seconds, debounce_seconds, max_wait_seconds)
+    watcher.open()
+    for path in folder_paths:
+        watcher.notice(path, now=time.monotonic() - max_wait_seconds)
+    try:
+        while True:
+            watcher.pump()
+            if time.monotonic() - watcher.last_poll >= poll_seconds:
+                watcher.poll()
+            for path in watcher.due():
+                watcher.finished(path, run_folder(command, path))
+                logging.info("Watch mode: %d runs since %s, %d folders waiting", watcher.runs,
+                             watcher.started.strftime("%Y-%m-%d %H:%M"), len(watcher.pending))
+            time.sleep(TICK_SECONDS)
+    except KeyboardInterrupt:
+        logging.info("Watch mode stopped after %d runs", watcher.runs)
+    finally:
+        watcher.close()